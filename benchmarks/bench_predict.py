@@ -0,0 +1,74 @@
+import os
+import sys
+import time
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #permette di importare schoolAI dalla cartella superiore
+from schoolAI import StudyRecommendationSystem
+
+SAMPLE = ('Visual', 'Matemática', '3-4 horas', 'Média') #input di esempio per il benchmark
+
+def legacy_predict(system, learning_style, subject, time_available, difficulty):
+    #percorso di inferenza precedente: due valutazioni della foresta e una inverse_transform per classe
+    input_data = pd.DataFrame([[learning_style, subject, time_available, difficulty]],
+                            columns=['learning_style', 'subject', 'time_available', 'difficulty'])
+    
+    for feature in input_data.columns:
+        if feature in system.encoders:
+            try:
+                input_data[feature] = system.encoders[feature].transform(input_data[feature])
+            except ValueError:
+                input_data[feature] = 0
+    
+    prediction = system.model.predict(input_data)[0]
+    predicted_method = system.encoders['target'].inverse_transform([prediction])[0]
+    
+    probabilities = system.model.predict_proba(input_data)[0]
+    method_probabilities = {}
+    for i, prob in enumerate(probabilities):
+        method = system.encoders['target'].inverse_transform([i])[0]
+        method_probabilities[method] = prob
+    
+    return predicted_method, method_probabilities
+
+def measure(function, repeat, warmup=20): #latenza per chiamata in millisecondi
+    for _ in range(warmup):
+        function()
+    
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings[i] = time.perf_counter() - start
+    return timings * 1000
+
+def report(name, timings):
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    print(f"{name:<10} media {timings.mean():7.3f} ms   p50 {p50:7.3f} ms   p95 {p95:7.3f} ms   p99 {p99:7.3f} ms")
+
+if __name__ == '__main__':
+    warnings.filterwarnings('ignore', message='X has feature names') #il percorso precedente passa un DataFrame al modello
+    parser = argparse.ArgumentParser(description='Micro-benchmark della latenza di StudyRecommendationSystem.predict')
+    parser.add_argument('--repeat', type=int, default=500, help='numero di chiamate misurate per percorso')
+    parser.add_argument('--backend', choices=['flat', 'sklearn'], default='flat', help='backend di inferenza del percorso attuale')
+    args = parser.parse_args()
+    
+    system = StudyRecommendationSystem()
+    system.use_response_table = False #misura solo il percorso di inferenza
+    system.inference_backend = args.backend
+    system.train_model()
+    
+    #i due percorsi devono dare lo stesso risultato
+    legacy_method, legacy_probabilities = legacy_predict(system, *SAMPLE)
+    method, probabilities = system.predict(*SAMPLE)
+    assert legacy_method == method and np.allclose(list(legacy_probabilities.values()), list(probabilities.values()))
+    
+    before = measure(lambda: legacy_predict(system, *SAMPLE), args.repeat)
+    after = measure(lambda: system.predict(*SAMPLE), args.repeat)
+    
+    report('prima', before)
+    report('dopo', after)
+    print(f"Speedup mediano: {np.median(before) / np.median(after):.2f}x")
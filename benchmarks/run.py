@@ -0,0 +1,345 @@
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import collections
+import platform
+import argparse
+import resource
+import tempfile
+import threading
+import http.client
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT) #permette di importare schoolAI dalla cartella superiore
+
+SAMPLE = {'learning_style': 'Visual', 'subject': 'Matemática', 'time_available': '3-4 horas', 'difficulty': 'Média'}
+UNSEEN = dict(SAMPLE, subject='Astronomia') #valore non presente nella tabella delle risposte: passa dal modello
+
+def percentiles(timings, prefix): #media e percentili di una lista di tempi in secondi, riportati in millisecondi
+    timings = np.asarray(timings) * 1000
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {f'{prefix}_mean_ms': float(timings.mean()), f'{prefix}_p50_ms': float(p50),
+            f'{prefix}_p95_ms': float(p95), f'{prefix}_p99_ms': float(p99)}
+
+def measure(function, repeat, warmup=20): #tempi di repeat chiamate, dopo alcune chiamate di riscaldamento
+    for _ in range(warmup):
+        function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def load_system(args): #sistema con il modello di riferimento caricato dall'artefatto
+    from schoolAI import StudyRecommendationSystem
+    system = StudyRecommendationSystem()
+    system.load_model(args.model_dir)
+    system.ensure_model()
+    return system
+
+def load_app_system(args): #carica il modello di riferimento nel sistema dell'applicazione, quello usato dalle route
+    import schoolAI
+    schoolAI.study_system.model_dir = args.model_dir #le route passano dal registro, che tiene questo stesso oggetto
+    schoolAI.study_system.load_model(args.model_dir)
+    schoolAI.study_system.ensure_model()
+    return schoolAI
+
+def bench_training(args, n_samples): #generazione dei dati e training a una data dimensione
+    from schoolAI import StudyRecommendationSystem
+    system = StudyRecommendationSystem()
+    
+    start = time.perf_counter()
+    system.generate_training_data(n_samples)
+    generation_s = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    system.train_model(n_samples)
+    return {'generation_s': generation_s, 'training_s': time.perf_counter() - start,
+            'accuracy': system.training_metadata['accuracy']}
+
+def bench_inference_single(args): #latenza di predict() su una riga per ogni backend
+    system = load_system(args)
+    values = tuple(SAMPLE.values())
+    results = {}
+    for backend in ('flat', 'sklearn'):
+        system.inference_backend = backend
+        repeat = args.repeat if backend == 'flat' else max(args.repeat // 10, 50) #sklearn è molto più lento
+        results.update(percentiles(measure(lambda: system.predict(*values), repeat), f'predict_{backend}'))
+    return results
+
+def bench_inference_batch(args): #latenza e throughput di predict_many() a varie dimensioni di batch
+    system = load_system(args)
+    results = {}
+    for size in args.batch_sizes:
+        records = [SAMPLE] * size
+        timings = measure(lambda: system.predict_many(records), max(args.repeat // max(size // 10, 1), 10), warmup=3)
+        results.update(percentiles(timings, f'batch_{size}'))
+        results[f'batch_{size}_records_per_s'] = size / float(np.median(timings))
+    return results
+
+def bench_study_plan(args): #latenza di generate_study_plan()
+    system = load_system(args)
+    method = system.study_methods[0]
+    return percentiles(measure(lambda: system.generate_study_plan(method, '3-4 horas', 'Média'), args.repeat * 10), 'study_plan')
+
+def bench_flask_client(args): #latenza di /predict attraverso il test client di Flask
+    schoolAI = load_app_system(args)
+    client = schoolAI.app.test_client()
+    results = {}
+    for name, body in (('table', SAMPLE), ('model', UNSEEN)): #risposta precalcolata e percorso completo del modello
+        timings = measure(lambda: client.post('/predict', json=body), args.repeat)
+        results.update(percentiles(timings, f'flask_{name}'))
+        results[f'flask_{name}_requests_per_s'] = len(timings) / sum(timings)
+    return results
+
+def load_generator(url, body, concurrency, duration): #POST concorrenti su connessioni keep-alive per duration secondi
+    target = urlsplit(url)
+    payload = json.dumps(body).encode('utf-8')
+    deadline = time.perf_counter() + duration
+    timings, errors = [], []
+    
+    def worker():
+        connection = http.client.HTTPConnection(target.hostname, target.port, timeout=30)
+        local_timings, local_errors = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request('POST', target.path or '/predict', payload, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                connection.close()
+            local_timings.append(time.perf_counter() - start)
+        connection.close()
+        timings.extend(local_timings) #list.extend è atomica
+        errors.append(local_errors)
+    
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    results = percentiles(timings, 'http') if timings else {}
+    results['http_requests_per_s'] = len(timings) / elapsed
+    results['http_errors'] = sum(errors)
+    return results
+
+def bench_http_load(args): #throughput di /predict attraverso un server HTTP locale multi-thread
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    
+    class QuietHandler(WSGIRequestHandler): #niente log per ogni richiesta durante il test di carico
+        def log_request(self, *args, **kwargs):
+            pass
+    
+    url = args.url
+    server = None
+    if url is None: #nessun server esterno: avvia il server di sviluppo in un thread
+        schoolAI = load_app_system(args)
+        server = make_server('127.0.0.1', 0, schoolAI.app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/predict'
+    try:
+        return load_generator(url, SAMPLE, args.concurrency, args.duration)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+async def async_load_generator(host, port, path, body, connections, duration):
+    #molte connessioni keep-alive aperte insieme su un solo event loop, ognuna manda POST in sequenza per duration secondi
+    payload = json.dumps(body).encode('utf-8')
+    request = (f'POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n'
+               f'Content-Length: {len(payload)}\r\n\r\n').encode('latin-1') + payload
+    timings, statuses = [], collections.Counter()
+    deadline = time.perf_counter() + duration
+    
+    async def client():
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            statuses['connect_error'] += 1
+            return
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                writer.write(request)
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                length = next(int(line.split(':', 1)[1]) for line in lines if line.lower().startswith('content-length:'))
+                await reader.readexactly(length)
+                timings.append(time.perf_counter() - start)
+                statuses[int(lines[0].split(' ')[1])] += 1
+        except (OSError, asyncio.IncompleteReadError):
+            statuses['connection_error'] += 1
+        finally:
+            writer.close()
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+    
+    results = percentiles(timings, 'async') if timings else {}
+    results['async_requests_per_s'] = len(timings) / elapsed
+    results['async_connections'] = connections
+    results['async_errors'] = sum(count for status, count in statuses.items() if status != 200)
+    return results
+
+def bench_async_load(args): #throughput di /predict con molte connessioni keep-alive sul server asyncio
+    target = urlsplit(args.url) if args.url else None
+    server = loop = thread = None
+    if target is None: #nessun server esterno: avvia il server asyncio in un thread con il proprio event loop
+        schoolAI = load_app_system(args)
+        schoolAI.raise_open_files_limit()
+        server = schoolAI.AsyncHTTPServer(schoolAI.asgi_app)
+        listen_socket = socket.create_server(('127.0.0.1', 0), backlog=4096)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_until_complete, args=(server.serve(sock=listen_socket),), daemon=True)
+        thread.start()
+        target = urlsplit(f'http://127.0.0.1:{listen_socket.getsockname()[1]}/predict')
+    try:
+        return asyncio.run(async_load_generator(target.hostname, target.port, target.path or '/predict', SAMPLE,
+                                                args.connections, args.duration))
+    finally:
+        if server is not None:
+            loop.call_soon_threadsafe(server.stop)
+            thread.join()
+
+STARTUP_SCRIPT = '''
+import sys, json, time, resource
+def rss_mb(): #picco di RSS del processo fino a questo punto
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+stages = {}
+start = time.perf_counter()
+import numpy
+stages['import_numpy_s'], stages['rss_numpy_mb'] = time.perf_counter() - start, rss_mb()
+import flask
+stages['import_flask_s'], stages['rss_flask_mb'] = time.perf_counter() - start, rss_mb()
+sys.path.insert(0, sys.argv[1])
+import schoolAI
+stages['import_schoolai_s'], stages['rss_import_mb'] = time.perf_counter() - start, rss_mb()
+schoolAI.study_system.load_model(sys.argv[2])
+schoolAI.study_system.ensure_model()
+stages['load_model_s'], stages['rss_model_mb'] = time.perf_counter() - start, rss_mb()
+schoolAI.app.test_client().post('/predict', json=json.loads(sys.argv[3]))
+stages['first_predict_s'], stages['rss_predict_mb'] = time.perf_counter() - start, rss_mb()
+stages['heavy_modules'] = sum(name in sys.modules for name in ('pandas', 'sklearn', 'scipy', 'joblib'))
+print(json.dumps(stages))
+'''
+
+def bench_startup(args): #tempi cumulativi e RSS dall'avvio dell'interprete alla prima risposta di /predict
+    #un interprete nuovo: i processi del pool hanno già importato questo modulo (e NumPy)
+    output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, ROOT, args.model_dir, json.dumps(SAMPLE)],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run_isolated(function, *params): #esegue un benchmark in un processo nuovo e ne misura il picco di RSS
+    metrics = function(*params)
+    metrics['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 #ru_maxrss è in KB su Linux
+    return metrics
+
+def higher_is_better(metric): #direzione di confronto con la baseline
+    return metric.endswith('_per_s') or metric == 'accuracy'
+
+def compare(results, baseline, threshold): #regressioni oltre la soglia rispetto alla baseline
+    regressions = []
+    for name, metrics in results['benchmarks'].items():
+        for metric, value in metrics.items():
+            reference = baseline.get('benchmarks', {}).get(name, {}).get(metric)
+            if not reference or metric.endswith('_errors'):
+                continue
+            change = (value - reference) / reference
+            if higher_is_better(metric):
+                change = -change
+            if change > threshold:
+                regressions.append(f'{name}.{metric}: {reference:.4g} -> {value:.4g} ({change:+.0%})')
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark di training, inferenza e livello HTTP di StudyAI')
+    parser.add_argument('--sizes', type=lambda v: [int(x) for x in v.split(',')], default=[1000, 100_000, 1_000_000],
+                        help='dimensioni dei dataset per il training, separate da virgola')
+    parser.add_argument('--batch-sizes', type=lambda v: [int(x) for x in v.split(',')], default=[1, 100, 1000, 5000],
+                        help='dimensioni dei batch per predict_many, separate da virgola')
+    parser.add_argument('--repeat', type=int, default=1000, help='chiamate misurate per i benchmark di latenza')
+    parser.add_argument('--concurrency', type=int, default=8, help='connessioni concorrenti del generatore di carico')
+    parser.add_argument('--duration', type=float, default=5.0, help='durata del test di carico HTTP in secondi')
+    parser.add_argument('--connections', type=int, default=1000, help='connessioni keep-alive del generatore di carico asyncio')
+    parser.add_argument('--url', help='URL di /predict di un server già avviato (default: server locale nel processo)')
+    parser.add_argument('--only', nargs='*', help='esegue solo i benchmark con questi nomi')
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmarks', 'results.json'), help='file JSON dei risultati')
+    parser.add_argument('--baseline', default=os.path.join(ROOT, 'benchmarks', 'baseline.json'), help='file JSON della baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='regressione massima ammessa (0.2 = 20%%)')
+    parser.add_argument('--update-baseline', action='store_true', help='salva i risultati come nuova baseline')
+    args = parser.parse_args()
+    
+    benchmarks = {f'training_{n}': (bench_training, n) for n in args.sizes}
+    benchmarks.update({
+        'inference_single': (bench_inference_single,),
+        'inference_batch': (bench_inference_batch,),
+        'study_plan': (bench_study_plan,),
+        'flask_client': (bench_flask_client,),
+        'http_load': (bench_http_load,),
+        'async_load': (bench_async_load,),
+        'startup': (bench_startup,)
+    })
+    if args.only:
+        benchmarks = {name: spec for name, spec in benchmarks.items() if name in args.only}
+    
+    with tempfile.TemporaryDirectory() as model_dir: #modello di riferimento condiviso da tutti i benchmark di inferenza
+        args.model_dir = model_dir
+        from schoolAI import StudyRecommendationSystem
+        reference = StudyRecommendationSystem()
+        reference.use_response_table = False
+        reference.train_model()
+        reference.save_model(model_dir)
+        
+        results = {
+            'meta': {
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'benchmarks': {}
+        }
+        context = multiprocessing.get_context('spawn') #ogni benchmark parte da un processo pulito
+        for name, (function, *params) in benchmarks.items():
+            print(f"Benchmark {name}...", flush=True)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results['benchmarks'][name] = executor.submit(run_isolated, function, args, *params).result()
+            for metric, value in results['benchmarks'][name].items():
+                print(f"    {metric:<32} {value:12.4f}")
+    
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Risultati salvati in {args.output}")
+    
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline aggiornata: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"Regressioni oltre il {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"    {regression}")
+            sys.exit(1)
+        print("Nessuna regressione rispetto alla baseline")
+    else:
+        print(f"Baseline {args.baseline} non trovata: confronto saltato (usa --update-baseline per crearla)")
@@ -1,21 +1,899 @@
 import os
-import webbrowser
+import sys
+import gc
+import signal
+import socket
+import argparse
 import threading
+import traceback
 import time
+import json
+import itertools
+import hashlib
+import hmac
+import gzip
+import bisect
+import queue
+import asyncio
+import collections
+import copy
+import pickle
+import re
+import weakref
+import glob
+import atexit
+import heapq
+import functools
+import tempfile
+import io
+import resource
+from http import HTTPStatus
+from urllib.parse import parse_qs
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from flask import Flask, render_template_string, request, jsonify
+from werkzeug.http import parse_accept_header, parse_etags
 import numpy as np
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
-import pickle
+#pandas, scikit-learn, joblib e pyarrow servono solo a training, selezione, scoring su file e backend 'sklearn': vengono
+#importati nelle funzioni che li usano, così il server che carica un artefatto già addestrato parte con NumPy e Flask
+try:
+    import brotli #opzionale: variante brotli della pagina principale
+except ImportError:
+    brotli = None
 
 app = Flask(__name__) #inizializza l'app Flask
 
+class Metrics: #contatori, gauge e istogrammi in memoria, esportati in formato testo Prometheus
+    BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+               0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) #limiti superiori degli istogrammi (secondi)
+    SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024) #limiti per istogrammi di dimensioni (es. batch)
+    
+    def __init__(self, enabled=True):
+        self.enabled = enabled #se False ogni chiamata ritorna subito
+        self.lock = threading.Lock()
+        self.counters = {} #(nome, etichette) -> valore
+        self.gauges = {} #(nome, etichette) -> valore
+        self.histograms = {} #(nome, etichette) -> [conteggi per bucket, somma, conteggio, limiti dei bucket]
+    
+    def inc(self, name, value=1, **labels): #incrementa un contatore
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def set_gauge(self, name, value, **labels): #imposta il valore di un gauge
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+    
+    def observe(self, name, value, buckets=BUCKETS, **labels): #aggiunge un valore a un istogramma
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(buckets, value) #primo bucket con limite >= valore
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0, buckets]
+            histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+    
+    def timer(self, endpoint): #timer per le fasi di una richiesta, nullo se le metriche sono disattivate
+        return StageTimer(self, endpoint) if self.enabled else NULL_TIMER
+    
+    def render(self): #testo nel formato di esposizione Prometheus
+        def labels_text(labels, extra=()):
+            labels = tuple(labels) + tuple(extra)
+            if not labels:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+        
+        lines = []
+        with self.lock:
+            for kind, series in (('counter', self.counters), ('gauge', self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(series.items()):
+                    if name not in typed:
+                        lines.append(f'# TYPE {name} {kind}')
+                        typed.add(name)
+                    lines.append(f'{name}{labels_text(labels)} {value}')
+            
+            typed = set()
+            for (name, labels), (counts, total, count, buckets) in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts): #i bucket Prometheus sono cumulativi
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{labels_text(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{labels_text(labels)} {total}')
+                lines.append(f'{name}_count{labels_text(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+class StageTimer: #misura le fasi consecutive di una richiesta
+    def __init__(self, metrics, endpoint):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.start = self.last = time.perf_counter()
+    
+    def stage(self, stage): #registra il tempo trascorso dalla fase precedente
+        now = time.perf_counter()
+        self.metrics.observe('studyai_stage_seconds', now - self.last, endpoint=self.endpoint, stage=stage)
+        self.last = now
+    
+    def finish(self): #registra la durata totale della richiesta
+        self.metrics.observe('studyai_request_seconds', time.perf_counter() - self.start, endpoint=self.endpoint)
+
+class NullTimer: #timer che non fa nulla, usato con le metriche disattivate
+    def stage(self, stage):
+        pass
+    
+    def finish(self):
+        pass
+
+NULL_TIMER = NullTimer()
+metrics = Metrics(enabled=os.environ.get('STUDYAI_METRICS', '1') != '0') #STUDYAI_METRICS=0 disattiva le metriche
+
+class PredictionCoalescer: #raccoglie le predizioni concorrenti e le valuta in un unico batch
+    def __init__(self, system, window=0.002, max_batch_size=64):
+        self.system = system
+        self.window = window #attesa massima (secondi) dopo la prima richiesta del batch
+        self.max_batch_size = max_batch_size #il batch parte subito quando è pieno
+        self.lock = threading.Lock()
+        self.queue = None
+        self.pid = None #il thread non sopravvive a fork(): viene riavviato nel processo figlio
+    
+    def submit(self, values): #accoda una riga (valori grezzi), ritorna un Future con (probabilità, stato del modello usato)
+        if self.pid != os.getpid():
+            self.start()
+        future = Future()
+        self.queue.put((values, future, time.perf_counter()))
+        return future
+    
+    def predict(self, values): #versione bloccante, per i server a thread
+        return self.submit(values).result()
+    
+    async def predict_async(self, values): #versione per asyncio: non blocca l'event loop
+        return await asyncio.wrap_future(self.submit(values))
+    
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.Queue()
+            worker = threading.Thread(target=self.run, args=(self.queue,), name='prediction-coalescer')
+            worker.daemon = True
+            worker.start()
+            self.pid = os.getpid()
+    
+    def run(self, requests): #ciclo del thread: attende la prima richiesta, poi raccoglie le altre fino alla finestra
+        while True:
+            batch = [requests.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.run_batch(batch)
+    
+    def run_batch(self, batch): #una sola valutazione del modello per tutto il batch
+        started = time.perf_counter()
+        state = self.system.state #tutto il batch usa lo stesso modello
+        X = np.empty((len(batch), len(state.features)), dtype=np.float32)
+        futures = []
+        for values, future, submitted in batch:
+            metrics.observe('studyai_coalescer_queue_seconds', started - submitted)
+            if not future.set_running_or_notify_cancel(): #il chiamante ha annullato la richiesta
+                continue
+            try:
+                X[len(futures)] = self.system.encode_input(values, state)
+            except Exception as e: #un input non valido fallisce da solo, non tutto il batch
+                future.set_exception(e)
+                continue
+            futures.append(future)
+        
+        if futures:
+            try:
+                probabilities = self.system.model_predict_proba(X[:len(futures)], state)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, row_probabilities in zip(futures, probabilities):
+                    future.set_result((row_probabilities, state))
+        metrics.observe('studyai_coalescer_batch_size', len(futures), buckets=Metrics.SIZE_BUCKETS)
+
+ARTIFACT_FORMAT_VERSION = 3 #versione del formato degli artefatti del modello salvati su disco
+SUPPORTED_ARTIFACT_VERSIONS = (1, 2, 3) #la versione 1 non contiene gli array della foresta esportata, la 3 aggiunge i pesi degli alberi
+DEFAULT_MODEL_DIR = os.environ.get('STUDYAI_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')) #cartella dell'artefatto
+
+#valori delle caratteristiche dei dati simulati
+TRAINING_CATEGORIES = {
+    'learning_style': ['Visual', 'Auditivo', 'Cinestésico', 'Leitura/Escrita'], #stili di apprendimento
+    'subject': ['Matemática', 'Ciências', 'História', 'Línguas', 'Literatura', 'Informática', 'Arte', 'Filosofia'], #materie
+    'time_available': ['1-2 horas', '3-4 horas', '5+ horas'], #tempo disponibile (ore)
+    'difficulty': ['Baixa', 'Média', 'Alta'], #difficoltà percepita
+    'study_method': [
+        'Leitura ativa e anotações', 'Flashcards e repetição espaçada', 'Mapas mentais e conceituais',
+        'Resolução prática de problemas', 'Estudo em grupo', 'Vídeos e materiais multimídia',
+        'Resumos e esquemas', 'Simulações e exercícios'
+    ]
+}
+
+#logica per assegnare i metodi di studio: per ogni stile, la caratteristica controllata, i valori che attivano
+#la regola e le due coppie di metodi (regola attiva, altrimenti) tra cui si sceglie a caso
+TRAINING_RULES = {
+    'Visual': ('subject', ['Matemática', 'Ciências'],
+               ['Mapas mentais e conceituais', 'Simulações e exercícios'],
+               ['Mapas mentais e conceituais', 'Vídeos e materiais multimídia']),
+    'Auditivo': ('difficulty', ['Alta'],
+                 ['Estudo em grupo', 'Vídeos e materiais multimídia'],
+                 ['Leitura ativa e anotações', 'Estudo em grupo']),
+    'Cinestésico': ('subject', ['Matemática', 'Ciências', 'Informática'],
+                    ['Resolução prática de problemas', 'Simulações e exercícios'],
+                    ['Flashcards e repetição espaçada', 'Estudo em grupo']),
+    'Leitura/Escrita': ('time_available', ['1-2 horas'],
+                        ['Resumos e esquemas', 'Flashcards e repetição espaçada'],
+                        ['Leitura ativa e anotações', 'Resumos e esquemas'])
+}
+
+#categorie ordinate come in LabelEncoder, così i codici generati coincidono con quelli dell'encoder
+TRAINING_VOCABULARIES = {column: sorted(values) for column, values in TRAINING_CATEGORIES.items()}
+
+TIME_BUDGETS = {'1-2 horas': 90, '3-4 horas': 210, '5+ horas': 300} #minuti di studio al giorno per tempo disponibile
+
+#sessioni di una giornata di studio per ogni metodo: (attività, divisore dei minuti giornalieri, minuti fissi)
+STUDY_SESSIONS = {
+    'Leitura ativa e anotações': [('Leitura preliminar', None, 15), ('Leitura aprofundada com anotações', 2, None),
+                                  ('Revisão e síntese', 4, None), ('Revisão final', 4, None)],
+    'Flashcards e repetição espaçada': [('Criação de flashcards', 3, None), ('Primeira sessão de revisão', 3, None),
+                                        ('Revisão espaçada', 3, None)],
+    'Mapas mentais e conceituais': [('Brainstorming de conceitos', 4, None), ('Criação do mapa mental', 2, None),
+                                    ('Revisão e conexões', 4, None)],
+    'Resolução prática de problemas': [('Estudo da teoria básica', 3, None), ('Resolução de problemas guiados', 2, None),
+                                       ('Prática independente', 6, None)],
+    'Estudo em grupo': [('Preparação individual', 4, None), ('Discussão em grupo', 2, None), ('Síntese coletiva', 4, None)],
+    'Vídeos e materiais multimídia': [('Visualização de vídeo introdutório', 3, None), ('Aprofundamento multimídia', 3, None),
+                                      ('Revisão ativa', 3, None)],
+    'Resumos e esquemas': [('Leitura e sublinhado', 3, None), ('Criação de resumo', 2, None), ('Revisão do esquema', 6, None)]
+}
+DEFAULT_STUDY_SESSIONS = [('Estudo preparatório', 4, None), ('Simulação prática', 2, None), ('Análise de erros', 4, None)]
+
+#giorni tra una ripetizione e la successiva, crescenti; la ripetizione spaziata ripassa più spesso
+REVIEW_INTERVALS = {
+    'Flashcards e repetição espaçada': [1, 2, 4, 8, 16, 32],
+    'Leitura ativa e anotações': [1, 3, 7, 14, 28],
+    'Resumos e esquemas': [1, 3, 7, 14, 28],
+    'Mapas mentais e conceituais': [2, 5, 12, 26]
+}
+DEFAULT_REVIEW_INTERVALS = [2, 6, 14, 30]
+DIFFICULTY_INTERVAL_FACTORS = {'Baixa': 1.25, 'Média': 1.0, 'Alta': 0.75} #materie difficili: ripetizioni più ravvicinate
+REVIEW_MINUTES = {'Baixa': 15, 'Média': 20, 'Alta': 30} #durata di una ripetizione
+NEW_MATERIAL_SHARE = 0.6 #quota dei minuti giornalieri per una materia nuova: il resto resta alle ripetizioni
+
+REVIEW_SESSION = 'Revisão programada'
+SESSION_LABELS = sorted({label for sessions in list(STUDY_SESSIONS.values()) + [DEFAULT_STUDY_SESSIONS] for label, _, _ in sessions}
+                        | {REVIEW_SESSION}) #codice di sessione -> attività
+SESSION_CODES = {label: code for code, label in enumerate(SESSION_LABELS)}
+
+def session_minutes(total_minutes, divisor, fixed): #minuti di una sessione della tabella STUDY_SESSIONS
+    return fixed if divisor is None else total_minutes // divisor
+
+@functools.lru_cache(maxsize=4096) #i parametri arrivano dalle richieste: la cache non deve crescere senza limite
+def schedule_template(method, time_available, difficulty, n_subjects, days):
+    #calendario di uno studente tipo, con le materie indicate per posizione (0..n_subjects-1): dipende solo da questi
+    #parametri, quindi viene calcolato una volta per profilo. Una coda con priorità ordina le attività per giorno;
+    #un'attività che non entra nei minuti del giorno passa al giorno dopo
+    budget = TIME_BUDGETS.get(time_available, 120)
+    factor = DIFFICULTY_INTERVAL_FACTORS.get(difficulty, 1.0)
+    intervals = [max(1, round(interval * factor)) for interval in REVIEW_INTERVALS.get(method, DEFAULT_REVIEW_INTERVALS)]
+    review_minutes = REVIEW_MINUTES.get(difficulty, 20)
+    learning = [(SESSION_CODES[label], session_minutes(int(budget * NEW_MATERIAL_SHARE), divisor, fixed))
+                for label, divisor, fixed in STUDY_SESSIONS.get(method, DEFAULT_STUDY_SESSIONS)]
+    learning_minutes = sum(minutes for _, minutes in learning)
+    
+    queue = [(slot, 1, slot, 0) for slot in range(n_subjects)] #(giorno, priorità: 0 ripetizione, 1 materia nuova, materia, ripetizione)
+    used = collections.Counter() #minuti già assegnati per giorno
+    rows = []
+    while queue:
+        day, priority, slot, repetition = heapq.heappop(queue)
+        if day >= days: #le attività restanti cadono tutte dopo la fine del calendario
+            break
+        needed = learning_minutes if repetition == 0 else review_minutes
+        if used[day] and used[day] + needed > budget: #il giorno è pieno: riprova il giorno dopo
+            heapq.heappush(queue, (day + 1, priority, slot, repetition))
+            continue
+        
+        used[day] += needed
+        if repetition == 0:
+            rows.extend((day, slot, session, minutes, 0) for session, minutes in learning)
+        else:
+            rows.append((day, slot, SESSION_CODES[REVIEW_SESSION], review_minutes, repetition))
+        if repetition < len(intervals): #la prossima ripetizione parte dal giorno in cui è stata fatta questa
+            heapq.heappush(queue, (day + intervals[repetition], 0, slot, repetition + 1))
+    
+    rows = np.array(rows, dtype=np.int32).reshape(-1, 5)
+    return {
+        'day': rows[:, 0].astype(np.int16),
+        'slot': rows[:, 1].astype(np.int16),
+        'session': rows[:, 2].astype(np.int8),
+        'minutes': rows[:, 3].astype(np.int16),
+        'repetition': rows[:, 4].astype(np.int8)
+    }
+
+def build_schedules(methods, times_available, difficulties, subjects, weeks=4):
+    #calendari di molti studenti: un modello per profilo (metodo, tempo, difficoltà, numero di materie) espanso con NumPy.
+    #Ritorna colonne (studente, giorno, materia, sessione, minuti, ripetizione) ordinate per studente e giorno, più le
+    #tabelle per decodificare materie e sessioni
+    days = 7 * weeks
+    subject_names = sorted({subject for student_subjects in subjects for subject in student_subjects})
+    subject_codes = {subject: code for code, subject in enumerate(subject_names)}
+    counts = np.array([len(student_subjects) for student_subjects in subjects], dtype=np.int64)
+    matrix = np.zeros((len(subjects), max(counts.max(initial=0), 1)), dtype=np.int16) #materie di ogni studente, per posizione
+    for i, student_subjects in enumerate(subjects):
+        matrix[i, :len(student_subjects)] = [subject_codes[subject] for subject in student_subjects]
+    
+    profiles = collections.defaultdict(list)
+    for i, profile in enumerate(zip(methods, times_available, difficulties, counts.tolist())):
+        profiles[profile].append(i)
+    
+    parts = collections.defaultdict(list)
+    for (method, time_available, difficulty, n_subjects), students in profiles.items():
+        template = schedule_template(method, time_available, difficulty, n_subjects, days)
+        students = np.array(students, dtype=np.int32)
+        rows = np.repeat(students, len(template['day']))
+        parts['student'].append(rows)
+        parts['subject'].append(matrix[rows, np.tile(template['slot'], len(students))])
+        for column in ('day', 'session', 'minutes', 'repetition'):
+            parts[column].append(np.tile(template[column], len(students)))
+    
+    columns = {column: np.concatenate(arrays) for column, arrays in parts.items()} if parts else \
+        {column: np.zeros(0, dtype=np.int32) for column in ('student', 'subject', 'day', 'session', 'minutes', 'repetition')}
+    order = np.lexsort((columns['day'], columns['student'])) #ordinamento stabile: nello stesso giorno resta l'ordine delle attività
+    return {
+        'weeks': weeks,
+        'columns': {column: values[order] for column, values in columns.items()},
+        'subjects': subject_names,
+        'sessions': SESSION_LABELS
+    }
+
+def generate_training_codes(seed_sequence, n_samples): #genera n_samples esempi come codici interi (int8) per colonna
+    rng = np.random.default_rng(seed_sequence)
+    codes = {
+        feature: rng.integers(0, len(TRAINING_VOCABULARIES[feature]), n_samples, dtype=np.int8)
+        for feature in ['learning_style', 'subject', 'time_available', 'difficulty']
+    }
+    coin = rng.integers(0, 2, n_samples, dtype=np.int8) #scelta casuale tra i due metodi della regola
+    
+    methods = np.empty(n_samples, dtype=np.int8)
+    method_code = {method: i for i, method in enumerate(TRAINING_VOCABULARIES['study_method'])}
+    for style, (feature, values, if_methods, else_methods) in TRAINING_RULES.items(): #una maschera per stile
+        rows = codes['learning_style'] == TRAINING_VOCABULARIES['learning_style'].index(style)
+        active = np.isin(codes[feature][rows], [TRAINING_VOCABULARIES[feature].index(v) for v in values])
+        pairs = np.where(active[:, None], [method_code[m] for m in if_methods], [method_code[m] for m in else_methods])
+        methods[rows] = pairs[np.arange(len(pairs)), coin[rows]]
+    
+    codes['study_method'] = methods
+    return codes
+
+def training_codes_to_frame(codes): #converte i codici in un DataFrame con colonne categoriche
+    import pandas as pd
+    return pd.DataFrame({
+        column: pd.Categorical.from_codes(column_codes, categories=TRAINING_VOCABULARIES[column])
+        for column, column_codes in codes.items()
+    })
+
+def iter_training_codes(n_samples, chunk_size, seed, n_jobs): #genera i codici a blocchi, in parallelo se n_jobs > 1
+    #ogni blocco ha un generatore indipendente: lo stesso seed dà gli stessi dati per qualsiasi n_jobs
+    sizes = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    
+    if n_jobs == 1:
+        yield from map(generate_training_codes, seeds, sizes)
+        return
+    
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        yield from executor.map(generate_training_codes, seeds, sizes) #mantiene l'ordine dei blocchi
+
+class Vocabulary: #valori di una variabile categorica in ordine di codice: come un LabelEncoder addestrato, senza sklearn
+    def __init__(self, classes):
+        self.classes_ = np.asarray(classes, dtype=object)
+    
+    def transform(self, values): #valori -> codici, ValueError per valori mai visti come LabelEncoder
+        values = np.asarray(values, dtype=object)
+        codes = np.searchsorted(self.classes_, values)
+        if np.any(codes >= len(self.classes_)) or np.any(self.classes_[np.minimum(codes, len(self.classes_) - 1)] != values):
+            raise ValueError(f"Valori non riconosciuti: {sorted(set(values.tolist()) - set(self.classes_.tolist()))}")
+        return codes
+    
+    def inverse_transform(self, codes): #codici -> valori
+        return self.classes_[np.asarray(codes)]
+
+def fit_label_encoder(values): #come LabelEncoder.fit_transform, ma riusa i codici delle colonne categoriche
+    if values.dtype.name == 'category':
+        values = values.cat.remove_unused_categories()
+        values = values.cat.reorder_categories(sorted(values.cat.categories)) #stesso ordine di LabelEncoder
+        return Vocabulary(values.cat.categories), values.cat.codes.to_numpy()
+    classes, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True) #come LabelEncoder.fit_transform
+    return Vocabulary(classes), codes
+
+def code_dtype(n_values): #tipo intero più piccolo che contiene i codici 0..n_values-1
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+class FileDataSource: #dati di training da file CSV, JSON Lines o Parquet, letti a blocchi senza caricarli tutti in memoria
+    def __init__(self, paths, columns, chunk_size=1_000_000, rename=None):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.columns = list(columns) #caratteristiche e variabile target, nell'ordine delle colonne della matrice
+        self.chunk_size = chunk_size #righe lette per blocco: insieme alla matrice codificata limita la memoria usata
+        self.rename = rename or {} #colonna nel file -> colonna richiesta, per file con nomi diversi
+    
+    def iter_chunks(self): #DataFrame di al massimo chunk_size righe, solo con le colonne richieste, come stringhe
+        import pandas as pd
+        file_names = {column: name for name, column in self.rename.items()}
+        file_columns = [file_names.get(column, column) for column in self.columns]
+        for path in self.paths:
+            if path.endswith(('.parquet', '.pq')):
+                try:
+                    import pyarrow.parquet as pq #opzionale: lettura dei dati di training in formato Parquet
+                except ImportError:
+                    raise ImportError('Per leggere i file Parquet serve pyarrow') from None
+                chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=self.chunk_size, columns=file_columns))
+            elif path.endswith(('.jsonl', '.ndjson')):
+                chunks = pd.read_json(path, lines=True, dtype=False, chunksize=self.chunk_size)
+            else:
+                chunks = pd.read_csv(path, usecols=file_columns, dtype=str, chunksize=self.chunk_size)
+            
+            for chunk in chunks:
+                chunk = chunk.rename(columns=self.rename)
+                missing = [column for column in self.columns if column not in chunk.columns]
+                if missing:
+                    raise ValueError(f"Colonne mancanti in {path}: {', '.join(missing)}")
+                yield chunk[self.columns].dropna().astype(str) #le righe incomplete vengono scartate in entrambi i passaggi
+    
+    def build_vocabularies(self): #primo passaggio: valori distinti di ogni colonna e numero di righe
+        values = {column: set() for column in self.columns}
+        n_rows = 0
+        for chunk in self.iter_chunks():
+            for column in self.columns:
+                values[column].update(chunk[column].unique())
+            n_rows += len(chunk)
+        return {column: sorted(column_values) for column, column_values in values.items()}, n_rows #ordine di LabelEncoder
+    
+    def encode(self, path): #secondo passaggio: codifica tutte le righe in una matrice .npy mappata in memoria
+        import pandas as pd
+        vocabularies, n_rows = self.build_vocabularies()
+        if not n_rows:
+            raise ValueError('Nessuna riga completa nei dati di training')
+        
+        dtype = code_dtype(max(len(vocabulary) for vocabulary in vocabularies.values())) #int8 per i vocabolari attuali
+        codes = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n_rows, len(self.columns)))
+        start = 0
+        for chunk in self.iter_chunks():
+            for j, column in enumerate(self.columns):
+                column_codes = pd.Categorical(chunk[column], categories=vocabularies[column]).codes
+                if (column_codes < 0).any(): #il file è cambiato tra i due passaggi
+                    raise ValueError(f"Valori non presenti nel vocabolario della colonna {column}")
+                codes[start:start + len(chunk), j] = column_codes
+            start += len(chunk)
+        
+        if start != n_rows:
+            raise ValueError('Il numero di righe è cambiato tra i due passaggi')
+        codes.flush()
+        return codes, vocabularies
+
+class FlatForest: #foresta esportata in array contigui di nodi, valutata con NumPy senza passare da sklearn
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots') #array salvati nell'artefatto
+    
+    def __init__(self, feature, threshold, left, right, value, roots, weights=None):
+        self.feature = feature #caratteristica controllata da ogni nodo
+        self.threshold = threshold #soglia del nodo (+inf nelle foglie, così si va sempre a sinistra)
+        self.left = left #figlio sinistro (la foglia punta a se stessa)
+        self.right = right #figlio destro (la foglia punta a se stessa)
+        self.value = value #probabilità delle classi in ogni nodo (nella foresta compattata solo nelle foglie, che hanno i primi indici)
+        self.roots = roots #indice della radice di ogni albero
+        self.weights = weights #numero di copie di ogni albero (None: tutti gli alberi contano uno)
+        
+        #profondità massima: numero di passi necessari perché ogni albero arrivi a una foglia
+        self.max_depth = 0
+        frontier = np.unique(roots)
+        while len(frontier):
+            frontier = frontier[left[frontier] != frontier] #scarta le foglie
+            frontier = np.unique(np.concatenate([left[frontier], right[frontier]])) #i sottoalberi condivisi vengono visitati una volta
+            self.max_depth += bool(len(frontier))
+    
+    @property
+    def nbytes(self): #memoria occupata dagli array della foresta
+        return sum(array.nbytes for array in (self.feature, self.threshold, self.left, self.right, self.value, self.roots,
+                                               self.weights) if array is not None)
+    
+    @classmethod
+    def from_sklearn(cls, model): #esporta un RandomForestClassifier addestrato
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            value = tree.value[:, 0, :]
+            values.append(value / value.sum(axis=1, keepdims=True)) #come DecisionTreeClassifier.predict_proba
+            roots.append(offset)
+            offset += tree.node_count
+        
+        index_type = np.int32 if offset < 2**31 else np.int64
+        return cls(
+            np.concatenate(features).astype(np.int32),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(lefts).astype(index_type),
+            np.concatenate(rights).astype(index_type),
+            np.concatenate(values).astype(np.float64),
+            np.array(roots, dtype=index_type)
+        )
+    
+    def predict_proba(self, X): #probabilità medie su tutti gli alberi, per una riga o per un batch
+        #sklearn confronta le soglie con l'input in float32; con soglie intere anche i codici diventano interi dello stesso tipo
+        X = np.asarray(X, dtype=np.float32 if self.threshold.dtype.kind == 'f' else self.threshold.dtype)
+        if X.ndim == 1:
+            X = X[None, :]
+        
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))) #un cursore per ogni (riga, albero)
+        for _ in range(self.max_depth): #tutti gli alberi avanzano insieme di un livello
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        
+        values = self.value[nodes]
+        if self.value.dtype == np.float64 and self.weights is None: #foresta esportata così com'è
+            return values.mean(axis=1)
+        
+        #foresta compattata: probabilità quantizzate, alberi pesati per il numero di copie, righe normalizzate a 1
+        values = values.astype(np.float32)
+        probabilities = values.mean(axis=1) if self.weights is None else np.tensordot(values, self.weights, axes=([1], [0]))
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+    
+    def contributions(self, X):
+        #scomposizione sui percorsi: la probabilità di ogni classe è la media delle radici (bias) più, per ogni caratteristica,
+        #la somma delle variazioni di probabilità nei nodi che la controllano lungo il percorso della riga
+        if len(self.value) != len(self.feature):
+            raise ValueError('La foresta compattata non ha le probabilità dei nodi interni')
+        X = np.asarray(X, dtype=np.float32 if self.threshold.dtype.kind == 'f' else self.threshold.dtype)
+        if X.ndim == 1:
+            X = X[None, :]
+        
+        contributions = np.zeros((len(X), X.shape[1], self.value.shape[1]))
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            feature = self.feature[nodes]
+            children = np.where(X[rows, feature] <= self.threshold[nodes], self.left[nodes], self.right[nodes])
+            delta = self.value[children] - self.value[nodes] #zero nelle foglie, che puntano a se stesse
+            for j in range(X.shape[1]):
+                contributions[:, j] += np.where((feature == j)[..., None], delta, 0.0).sum(axis=1)
+            nodes = children
+        
+        return self.value[self.roots].mean(axis=0), contributions / len(self.roots)
+    
+    def compact(self, leaf_dtype='float16', tolerance=0.0, max_trees=None):
+        #versione compatta della foresta: sottoalberi identici condivisi (anche tra alberi diversi), alberi uguali contati una
+        #volta con un peso, nodi le cui foglie differiscono al massimo di tolerance trasformati in foglie, soglie intere e
+        #probabilità delle foglie in float16 o uint8; max_trees tiene solo gli alberi con più copie
+        if len(self.value) != len(self.feature):
+            raise ValueError('La foresta è già compattata')
+        
+        def quantize(value):
+            if leaf_dtype == 'uint8':
+                return np.round(value * 255).astype(np.uint8)
+            return value.astype(np.float16)
+        
+        leaf_refs, leaf_values = {}, []
+        node_refs, node_rows = {}, []
+        
+        def leaf(value): #riferimento >= 0: foglia, riferimento < 0: nodo interno
+            q = quantize(value)
+            key = q.tobytes()
+            if key not in leaf_refs: #foglie con le stesse probabilità quantizzate sono un solo nodo
+                leaf_refs[key] = len(leaf_values)
+                leaf_values.append(q)
+            return leaf_refs[key]
+        
+        def visit(node): #riferimento del nodo compattato e probabilità originali delle foglie sottostanti
+            if self.left[node] == node:
+                return leaf(self.value[node]), [self.value[node]]
+            left_ref, left_leaves = visit(self.left[node])
+            right_ref, right_leaves = visit(self.right[node])
+            leaves = left_leaves + right_leaves
+            if left_ref == right_ref: #i due rami danno lo stesso risultato
+                return left_ref, leaves
+            if tolerance > 0 and max(np.abs(value - self.value[node]).max() for value in leaves) <= tolerance:
+                return leaf(self.value[node]), leaves
+            #gli input sono codici interi: x <= 2.5 equivale a x <= 2
+            key = (int(self.feature[node]), int(np.floor(self.threshold[node])), left_ref, right_ref)
+            if key not in node_refs:
+                node_refs[key] = ~len(node_rows)
+                node_rows.append(key)
+            return node_refs[key], leaves
+        
+        copies = collections.Counter(visit(root)[0] for root in self.roots)
+        kept = copies.most_common(max_trees) #alberi distinti, dal più frequente
+        
+        #rinumera i nodi raggiungibili dagli alberi tenuti: prima le foglie, poi i nodi interni
+        leaf_order, node_order = {}, {}
+        stack = [ref for ref, _ in kept]
+        while stack:
+            ref = stack.pop()
+            if ref >= 0:
+                leaf_order.setdefault(ref, len(leaf_order))
+            elif ref not in node_order:
+                node_order[ref] = len(node_order)
+                stack.extend(node_rows[~ref][2:])
+        
+        n_leaves, n_nodes = len(leaf_order), len(leaf_order) + len(node_order)
+        index = lambda ref: leaf_order[ref] if ref >= 0 else n_leaves + node_order[ref]
+        index_type = code_dtype(n_nodes)
+        feature = np.zeros(n_nodes, dtype=np.int8)
+        threshold = np.zeros(n_nodes, dtype=np.int16) #nelle foglie non viene usata: i figli sono la foglia stessa
+        left = np.arange(n_nodes, dtype=index_type)
+        right = np.arange(n_nodes, dtype=index_type)
+        for ref, i in node_order.items():
+            node_feature, node_threshold, left_ref, right_ref = node_rows[~ref]
+            feature[n_leaves + i] = node_feature
+            threshold[n_leaves + i] = node_threshold
+            left[n_leaves + i] = index(left_ref)
+            right[n_leaves + i] = index(right_ref)
+        
+        value = np.empty((n_leaves, self.value.shape[1]), dtype=leaf_values[0].dtype)
+        for ref, i in leaf_order.items():
+            value[i] = leaf_values[ref]
+        
+        if threshold.max(initial=0) <= np.iinfo(np.int8).max:
+            threshold = threshold.astype(np.int8)
+        roots = np.array([index(ref) for ref, _ in kept], dtype=index_type)
+        weights = np.array([count for _, count in kept], dtype=np.float32)
+        return FlatForest(feature, threshold, left, right, value, roots, weights if (weights > 1).any() else None)
+
+COMPACTION_LEVELS = [('float16', 0.0), ('uint8', 0.0), ('uint8', 0.01), ('uint8', 0.02), ('uint8', 0.05), ('uint8', 0.1),
+                     ('uint8', 0.2)] #(probabilità delle foglie, tolleranza) dal meno al più aggressivo
+
+def forest_drift(reference, candidate, X): #differenze tra le predizioni di due foreste sugli stessi input
+    before = reference.predict_proba(X)
+    after = candidate.predict_proba(X)
+    drift = np.abs(after - before)
+    return {
+        'agreement': float(np.mean(np.argmax(before, axis=1) == np.argmax(after, axis=1))), #stessa classe predetta
+        'max_abs_drift': float(drift.max()),
+        'mean_abs_drift': float(drift.mean())
+    }
+
+def compact_forest(forest, X, max_bytes=None, leaf_dtype='float16', tolerance=0.0):
+    #compatta la foresta e misura la deriva sugli input X; con max_bytes prova livelli sempre più aggressivi,
+    #poi riduce gli alberi distinti, finché la foresta non entra nel budget
+    levels = [(leaf_dtype, tolerance, None)]
+    if max_bytes is not None:
+        levels += [(dtype, level_tolerance, None) for dtype, level_tolerance in COMPACTION_LEVELS #solo i livelli più aggressivi
+                   if level_tolerance > tolerance or (level_tolerance == tolerance and np.dtype(dtype).itemsize < np.dtype(leaf_dtype).itemsize)]
+    
+    for leaf_dtype, tolerance, max_trees in levels:
+        compacted = forest.compact(leaf_dtype, tolerance, max_trees)
+        if max_bytes is None or compacted.nbytes <= max_bytes:
+            break
+        if levels[-1][0:2] == (leaf_dtype, tolerance) and len(compacted.roots) > 1: #ultimo livello: meno alberi
+            levels.append((leaf_dtype, tolerance, len(compacted.roots) // 2))
+    else:
+        raise ValueError(f"Impossibile compattare la foresta entro {max_bytes} byte")
+    
+    report = {
+        'max_bytes': max_bytes,
+        'leaf_dtype': leaf_dtype,
+        'tolerance': tolerance,
+        'trees': len(forest.roots),
+        'distinct_trees': len(compacted.roots),
+        'tree_copies': int(compacted.weights.sum()) if compacted.weights is not None else len(compacted.roots),
+        'nodes': len(forest.feature),
+        'compacted_nodes': len(compacted.feature),
+        'bytes': forest.nbytes,
+        'compacted_bytes': compacted.nbytes
+    }
+    report.update(forest_drift(forest, compacted, X))
+    return compacted, report
+
+def model_version(metadata): #versione del modello: impronta dei metadati, cambia a ogni training, aggiornamento o compattazione
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+def file_sha256(path): #checksum SHA-256 di un file, letto a blocchi
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class LookupTableClassifier: #probabilità delle classi contate per ogni combinazione di input (4x8x3x3 = 288 righe)
+    def __init__(self, n_values, alpha=1.0):
+        self.n_values = tuple(n_values) #numero di valori di ogni caratteristica
+        self.alpha = alpha #peso della distribuzione globale per le combinazioni con pochi esempi
+    
+    def fit(self, X, y):
+        self.classes_ = np.unique(y)
+        counts = np.zeros((int(np.prod(self.n_values)), len(self.classes_)))
+        np.add.at(counts, (self.combination_index(X), np.searchsorted(self.classes_, y)), 1)
+        prior = counts.sum(axis=0) / counts.sum() #le combinazioni mai viste ricevono la distribuzione globale
+        counts += self.alpha * prior
+        self.table = counts / counts.sum(axis=1, keepdims=True)
+        return self
+    
+    def combination_index(self, X): #riga della tabella per ogni riga di input
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        return np.ravel_multi_index(X.astype(np.intp).T, self.n_values)
+    
+    def predict_proba(self, X):
+        return self.table[self.combination_index(X)]
+    
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+    
+    def score(self, X, y):
+        return float(np.mean(self.predict(X) == y))
+
+#configurazioni confrontate da select_model: (tipo, parametri)
+MODEL_CANDIDATES = [('forest', {'n_estimators': n, 'max_depth': depth}) for n in (10, 50, 100) for depth in (None, 6)] + [
+    ('naive_bayes', {}),
+    ('lookup_table', {})
+]
+SERVABLE_KINDS = ('forest',) #tipi che il server sa servire: gli altri sono confrontati solo a titolo informativo
+
+def make_candidate(kind, params, n_values): #crea il classificatore di una configurazione
+    if kind == 'forest':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=42, **params)
+    if kind == 'naive_bayes':
+        from sklearn.naive_bayes import CategoricalNB
+        return CategoricalNB(min_categories=np.asarray(n_values), **params)
+    if kind == 'lookup_table':
+        return LookupTableClassifier(n_values, **params)
+    raise ValueError(f"Tipo di modello sconosciuto: {kind}")
+
+def candidate_name(kind, params):
+    return kind + ''.join(f' {key}={value}' for key, value in params.items())
+
+def served_model(kind, model): #oggetto usato in inferenza: le foreste vengono servite come FlatForest
+    return FlatForest.from_sklearn(model) if kind == 'forest' else model
+
+CV_DATA = {} #dati e fold della cross-validation, impostati una volta per processo del pool da init_cv_worker
+
+def init_cv_worker(X, y, splits): #con fork gli array (anche mappati da file) sono ereditati, non copiati per ogni fold
+    CV_DATA.update(X=X, y=y, splits=splits)
+
+def cross_validate_fold(kind, params, n_values, fold): #un fold: accuratezza e tempo di training
+    X, y = CV_DATA['X'], CV_DATA['y']
+    train_index, test_index = CV_DATA['splits'][fold]
+    model = make_candidate(kind, params, n_values)
+    start = time.perf_counter()
+    model.fit(X[train_index], y[train_index])
+    fit_time = time.perf_counter() - start
+    return model.score(X[test_index], y[test_index]), fit_time
+
+def measure_candidate(kind, params, n_values, X, y, repeat=200, batch_size=1000):
+    #addestra su tutti i dati e misura latenza (riga singola e batch) e dimensione del modello servito
+    model = served_model(kind, make_candidate(kind, params, n_values).fit(X, y))
+    row = np.asarray(X[:1], dtype=np.float32)
+    batch = np.asarray(X[:batch_size], dtype=np.float32)
+    
+    def median_ms(call, n):
+        call() #la prima chiamata non viene misurata
+        samples = []
+        for _ in range(n):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        return float(np.median(samples) * 1000)
+    
+    return {
+        'single_ms': median_ms(lambda: model.predict_proba(row), repeat),
+        'batch_ms': median_ms(lambda: model.predict_proba(batch), max(repeat // 20, 5)),
+        'size_bytes': len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
+    }
+
+def pareto_front(results): #configurazioni non dominate per accuratezza (più alta) e latenza a riga singola (più bassa)
+    def dominates(a, b):
+        return (a['accuracy'] >= b['accuracy'] and a['single_ms'] <= b['single_ms']
+                and (a['accuracy'] > b['accuracy'] or a['single_ms'] < b['single_ms']))
+    return [r for r in results if not any(dominates(other, r) for other in results)]
+
+def select_model(X, y, n_values, candidates=MODEL_CANDIDATES, folds=5, n_jobs=1, latency_budget_ms=None, repeat=200):
+    #cross-validation k-fold in parallelo (un processo per coppia configurazione/fold), poi misure di latenza in sequenza
+    from sklearn.model_selection import StratifiedKFold
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=42).split(X, y))
+    
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_cv_worker, initargs=(X, y, splits)) as executor:
+        futures = { #ogni attività riceve solo la configurazione e il numero del fold
+            (i, fold): executor.submit(cross_validate_fold, kind, params, n_values, fold)
+            for i, (kind, params) in enumerate(candidates)
+            for fold in range(folds)
+        }
+        scores = {key: future.result() for key, future in futures.items()}
+    
+    results = []
+    for i, (kind, params) in enumerate(candidates): #latenze misurate un modello alla volta, senza processi concorrenti
+        accuracies, fit_times = zip(*(scores[i, fold] for fold in range(folds)))
+        result = {
+            'name': candidate_name(kind, params),
+            'kind': kind,
+            'params': params,
+            'accuracy': float(np.mean(accuracies)),
+            'accuracy_std': float(np.std(accuracies)),
+            'training_s': float(np.mean(fit_times))
+        }
+        result.update(measure_candidate(kind, params, n_values, X, y, repeat))
+        results.append(result)
+    
+    front = pareto_front(results)
+    servable_front = pareto_front([r for r in results if r['kind'] in SERVABLE_KINDS]) #la scelta deve poter essere servita
+    eligible = [r for r in servable_front if latency_budget_ms is None or r['single_ms'] <= latency_budget_ms]
+    best = max(eligible, key=lambda r: (r['accuracy'], -r['single_ms']), default=None) #la più accurata entro il budget
+    for r in results:
+        r['pareto'] = r in front
+        r['servable'] = r['kind'] in SERVABLE_KINDS
+    return {'folds': folds, 'n_samples': len(y), 'latency_budget_ms': latency_budget_ms, 'results': results,
+            'selected': best['name'] if best else None}
+
+class ModelState: #modello, encoder e strutture derivate: vengono sostituiti insieme con un solo assegnamento
+    def __init__(self, model, encoders, flat_forest, metadata, features, model_classes=None, model_loader=None):
+        self.loaded_model = model #modello di machine learning, None finché non viene caricato da model_loader
+        self.model_loader = model_loader #carica il modello sklearn dall'artefatto al primo uso
+        self.model_lock = threading.Lock()
+        self.model_classes = np.asarray(model.classes_ if model_classes is None else model_classes) #codici delle classi del modello
+        self.encoders = encoders #encoder delle variabili categoriche e della variabile target
+        self.flat_forest = flat_forest #foresta esportata per il backend 'flat'
+        self.metadata = metadata #informazioni sull'addestramento (dati, accuratezza, tempi, aggiornamenti)
+        self.version = model_version(metadata) #riportata in ogni risposta di /predict e nelle metriche
+        self.features = features #caratteristiche di input, nell'ordine delle colonne del modello
+        self.class_names = encoders['target'].inverse_transform(self.model_classes) #nomi dei metodi per indice di classe
+        self.feature_codes = { #codifica con un dizionario invece di LabelEncoder.transform
+            feature: {str(value): code for code, value in enumerate(encoders[feature].classes_)}
+            for feature in features
+        }
+        self.response_table = {} #tabella (stile, materia, tempo, difficoltà) -> (risposta, bytes JSON)
+        self.explanations = None #contributi delle caratteristiche per ogni combinazione di input (vedi build_explanations)
+        self.replay = None #campione dei dati di training (codici, target nell'ultima colonna) ripassato dagli aggiornamenti
+    
+    @property
+    def model(self): #il modello sklearn serve solo ad aggiornamenti, compattazione e backend 'sklearn': caricato al primo uso
+        if self.loaded_model is None:
+            with self.model_lock:
+                if self.loaded_model is None:
+                    self.loaded_model = self.model_loader()
+        return self.loaded_model
+
 class StudyRecommendationSystem: #sistema di raccomandazione metodi di studio
-    def __init__(self): 
-        self.model = None #modello di machine learning
-        self.encoders = {} #dizionario per gli encoder delle variabili categoriche
+    def __init__(self):
+        self.state = None #ModelState corrente: ogni richiesta lo legge una volta e usa sempre lo stesso
+        self.model_dir = DEFAULT_MODEL_DIR #cartella dell'artefatto del modello
+        self.inference_backend = os.environ.get('STUDYAI_INFERENCE_BACKEND', 'flat') #'flat' (FlatForest) oppure 'sklearn'
+        self.init_lock = threading.Lock() #un solo thread alla volta carica o addestra il modello
+        self.ready = threading.Event() #impostato quando il modello è caricato e riscaldato
+        self.init_error = None #ultimo errore dell'inizializzazione, se fallita
+        self.unknown_policy = os.environ.get('STUDYAI_UNKNOWN_POLICY', 'first') #valori sconosciuti: 'first' (codice 0) oppure 'error'
+        self.input_buffers = threading.local() #riga di input preallocata per ogni thread
+        coalesce_window_ms = float(os.environ.get('STUDYAI_COALESCE_WINDOW_MS', 0)) #0 disattiva il micro-batching
+        self.coalescer = PredictionCoalescer(self, coalesce_window_ms / 1000, int(os.environ.get('STUDYAI_COALESCE_MAX_BATCH', 64))) \
+            if coalesce_window_ms > 0 else None #raccoglie le predizioni concorrenti in un unico batch
         self.study_methods = [ #metodi di studio disponibili
             'Leitura ativa e anotações',
             'Flashcards e repetição espaçada',
@@ -36,65 +914,100 @@ class StudyRecommendationSystem: #sistema di raccomandazione metodi di studio
             'Resumos e esquemas': ['Obsidian', 'Modelos do Notion', 'Ferramentas de mapas mentais'],
             'Simulações e exercícios': ['Testes práticos', 'Software de simulação', 'Plataformas de quiz']
         }
-        
-    def generate_training_data(self): #genera dati di training simulati per il modello
-        np.random.seed(42) #42 è il seme per la riproducibilità
+        self.features = ['learning_style', 'subject', 'time_available', 'difficulty'] #caratteristiche di input
+        self.use_response_table = True #usa la tabella delle risposte precalcolate per /predict
+        self.response_table_build_time = 0.0 #tempo di costruzione della tabella in secondi
+        self.response_table_hits = 0 #richieste servite dalla tabella
+        self.response_table_misses = 0 #richieste servite dal modello
+        self.max_batch_size = int(os.environ.get('STUDYAI_MAX_BATCH_SIZE', 5000)) #numero massimo di record per /predict/batch
+        self.feedback = collections.deque(maxlen=int(os.environ.get('STUDYAI_FEEDBACK_WINDOW', 5000))) #riscontri più recenti
+        self.feedback_lock = threading.Lock()
+        self.feedback_pending = 0 #riscontri arrivati dopo l'ultimo aggiornamento
+        self.update_lock = threading.Lock() #un solo aggiornamento incrementale alla volta
+        self.update_trees = int(os.environ.get('STUDYAI_UPDATE_TREES', 10)) #alberi nuovi (e vecchi ritirati) per aggiornamento
+        self.min_feedback = int(os.environ.get('STUDYAI_UPDATE_MIN_FEEDBACK', 100)) #riscontri nuovi necessari per aggiornare
+        self.encoder_cache = None #encoder condivisi tra i modelli con lo stesso vocabolario (vedi ModelRegistry)
+        self.forest_params = {'n_estimators': 100} #parametri della foresta, scelti con il comando select
+        self.replay_samples = 1000 #esempi di training aggiunti ai riscontri, così ogni classe è rappresentata
+        self.previous_state = None #stato sostituito dall'ultimo ricaricamento: rollback immediato
+        self.rejected_versions = set() #versioni annullate con un rollback: il controllo della cartella non le ricarica
+        self.reload_min_agreement = float(os.environ.get('STUDYAI_RELOAD_MIN_AGREEMENT', 0)) #quota minima di raccomandazioni uguali al modello corrente
     
-        learning_styles = ['Visual', 'Auditivo', 'Cinestésico', 'Leitura/Escrita'] #stili di apprendimento
-        subjects = ['Matemática', 'Ciências', 'História', 'Línguas', 'Literatura', 'Informática', 'Arte', 'Filosofia']  #materie
-        time_available = ['1-2 horas', '3-4 horas', '5+ horas'] #tempo disponibile (ore)
-        difficulty = ['Baixa', 'Média', 'Alta'] #difficoltà percepita
-        data = [] #lista per memorizzare i dati generati
-
-        for _ in range(1000):  #genera 1000 esempi
-            style = np.random.choice(learning_styles) #stile di apprendimento
-            subject = np.random.choice(subjects) #materia
-            time = np.random.choice(time_available) #tempo disponibile
-            diff = np.random.choice(difficulty) #difficoltà percepita
-            
-            #logica per assegnare metodi di studio
-            if style == 'Visual': #se lo stile è visuale
-                if subject in ['Matemática', 'Ciências']: #se la materia è matematica o scienze
-                    method = np.random.choice(['Mapas mentais e conceituais', 'Simulações e exercícios']) #sceglie tra questi metodi
-                else: #altrimenti
-                    method = np.random.choice(['Mapas mentais e conceituais', 'Vídeos e materiais multimídia']) #sceglie tra questi metodi
-            elif style == 'Auditivo':
-                if diff == 'Alta':
-                    method = np.random.choice(['Estudo em grupo', 'Vídeos e materiais multimídia'])
-                else:
-                    method = np.random.choice(['Leitura ativa e anotações', 'Estudo em grupo'])
-            elif style == 'Cinestésico':
-                if subject in ['Matemática', 'Ciências', 'Informática']:
-                    method = np.random.choice(['Resolução prática de problemas', 'Simulações e exercícios'])
-                else:
-                    method = np.random.choice(['Flashcards e repetição espaçada', 'Estudo em grupo'])
-            else: 
-                if time == '1-2 horas':
-                    method = np.random.choice(['Resumos e esquemas', 'Flashcards e repetição espaçada'])
-                else:
-                    method = np.random.choice(['Leitura ativa e anotações', 'Resumos e esquemas'])
-            
-            data.append([style, subject, time, diff, method]) #aggiunge l'esempio ai dati
-        
-        return pd.DataFrame(data, columns=['learning_style', 'subject', 'time_available', 'difficulty', 'study_method']) #ritorna il DataFrame con i dati generati
+    #accesso in sola lettura allo stato corrente, per il codice che non ha bisogno di una vista coerente
+    model = property(lambda self: self.state.model if self.state else None)
+    encoders = property(lambda self: self.state.encoders if self.state else {})
+    class_names = property(lambda self: self.state.class_names if self.state else None)
+    flat_forest = property(lambda self: self.state.flat_forest if self.state else None)
+    feature_codes = property(lambda self: self.state.feature_codes if self.state else {})
+    training_metadata = property(lambda self: self.state.metadata if self.state else {})
+    model_version = property(lambda self: self.state.version if self.state else None)
+    response_table = property(lambda self: self.state.response_table if self.state else {})
+    
+    def generate_training_data(self, n_samples=1000, seed=42, chunk_size=1_000_000, n_jobs=1):
+        #genera dati di training simulati per il modello (42 è il seme per la riproducibilità)
+        chunks = list(iter_training_codes(n_samples, chunk_size, seed, n_jobs))
+        codes = {column: np.concatenate([chunk[column] for chunk in chunks]) for column in TRAINING_VOCABULARIES}
+        return training_codes_to_frame(codes) #ritorna il DataFrame con i dati generati
     
-    def train_model(self): #addestra il modello di machine learning
-        df = self.generate_training_data() #genera dati di training
+    def iter_training_data(self, n_samples, seed=42, chunk_size=1_000_000, n_jobs=1):
+        #genera i dati a blocchi di chunk_size righe, per usarli senza tenerli tutti in memoria
+        for codes in iter_training_codes(n_samples, chunk_size, seed, n_jobs):
+            yield training_codes_to_frame(codes)
+    
+    def train_model(self, n_samples=1000, source=None): #addestra il modello di machine learning
+        #source: FileDataSource con i dati reali; senza, vengono generati n_samples esempi simulati
+        if source is not None:
+            with tempfile.TemporaryDirectory(prefix='studyai-') as tmp_dir: #la matrice codificata esiste solo durante il training
+                return self.train_model_from_source(source, os.path.join(tmp_dir, 'codes.npy'))
+        
+        start = time.perf_counter()
+        df = self.generate_training_data(n_samples) #genera dati di training
         
-        features = ['learning_style', 'subject', 'time_available', 'difficulty'] #caratteristiche di input
+        features = self.features #caratteristiche di input
         target = 'study_method' #variabile target
         
         X = df[features].copy() #dati di input
         y = df[target] #variabile target
         
+        encoders = {} #nuovi encoder, sostituiscono quelli attuali solo a fine training
         for feature in features: #per ogni caratteristica
-            le = LabelEncoder() #crea un encoder
-            X[feature] = le.fit_transform(X[feature]) #codifica la caratteristica
-            self.encoders[feature] = le #salva l'encoder nel dizionario
+            le, X[feature] = fit_label_encoder(X[feature]) #crea un encoder e codifica la caratteristica
+            encoders[feature] = le #salva l'encoder nel dizionario
+        
+        target_encoder, y_encoded = fit_label_encoder(y) #encoder e codifica della variabile target
+        encoders['target'] = target_encoder #salva l'encoder nel dizionario
+        
+        #senza nomi di colonna: in inferenza il modello riceve ndarray
+        self.fit_encoded(X.to_numpy(), y_encoded, encoders, start, {'data_source': 'synthetic'})
+    
+    def train_model_from_source(self, source, codes_path): #addestra dai file, passando per una matrice di codici su disco
+        if source.columns != self.features + ['study_method']:
+            raise ValueError(f"Le colonne dei dati devono essere {self.features + ['study_method']}")
+        
+        start = time.perf_counter()
+        codes, vocabularies = source.encode(codes_path) #due passaggi a blocchi, poi una matrice int8/int16 mappata in memoria
+        
+        encoders = {}
+        for column, vocabulary in zip(self.features + ['target'], vocabularies.values()):
+            encoders[column] = Vocabulary(vocabulary) #encoder ricostruito dal vocabolario, senza fit sull'intera colonna
         
-        target_encoder = LabelEncoder() #encoder per la variabile target
-        y_encoded = target_encoder.fit_transform(y) #codifica la variabile target
-        self.encoders['target'] = target_encoder #salva l'encoder nel dizionario
+        metadata = {'data_source': [os.path.basename(path) for path in source.paths], 'encoded_bytes': int(codes.nbytes)}
+        self.fit_encoded(codes[:, :-1], codes[:, -1], encoders, start, metadata)
+    
+    def training_codes(self, n_samples=1000, source=None, codes_path=None):
+        #dati di training già codificati: matrice delle caratteristiche, target e numero di valori di ogni caratteristica
+        if source is None:
+            chunks = list(iter_training_codes(n_samples, 1_000_000, 42, 1))
+            codes = np.column_stack([np.concatenate([chunk[column] for chunk in chunks]) for column in self.features + ['study_method']])
+            vocabularies = TRAINING_VOCABULARIES
+        else:
+            codes, vocabularies = source.encode(codes_path)
+        return codes[:, :-1], codes[:, -1], [len(vocabularies[feature]) for feature in self.features]
+    
+    def fit_encoded(self, X, y_encoded, encoders, start, metadata): #addestramento e pubblicazione a partire dai codici
+        import sklearn
+        from sklearn.model_selection import train_test_split
+        from sklearn.ensemble import RandomForestClassifier
         
         #suddivide i dati in training e test (20% per il test, 80% per il training)
         X_train, X_test, y_train, y_test = train_test_split(
@@ -102,96 +1015,946 @@ class StudyRecommendationSystem: #sistema di raccomandazione metodi di studio
         )
         
         #addestra il modello
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42) #n_estimators è il numero di alberi nella foresta e random_state è per la riproducibilità
-        self.model.fit(X_train, y_train) #addestra il modello sui dati di training
+        model = RandomForestClassifier(random_state=42, **self.forest_params) #n_estimators è il numero di alberi nella foresta e random_state è per la riproducibilità
+        model.fit(X_train, y_train) #addestra il modello sui dati di training
         
-        accuracy = self.model.score(X_test, y_test) #calcola l'accuratezza sui dati di test
+        accuracy = model.score(X_test, y_test) #calcola l'accuratezza sui dati di test
         print(f"Accuratezza del modello: {accuracy:.2f}") #stampa l'accuratezza del modello
+        
+        metadata = dict({ #informazioni salvate insieme all'artefatto
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'n_samples': len(X),
+            'n_estimators': model.n_estimators,
+            'accuracy': float(accuracy),
+            'training_time_s': time.perf_counter() - start,
+            'sklearn_version': sklearn.__version__
+        }, **metadata)
+        
+        #esporta la foresta per il backend 'flat' e prepara il nuovo stato prima di pubblicarlo
+        state = ModelState(model, encoders, FlatForest.from_sklearn(model), metadata, self.features)
+        state.replay = self.replay_sample(X_train, y_train)
+        self.prepare_inference(state)
+        self.publish(state)
     
-    def predict(self, learning_style, subject, time_available, difficulty):
-        #a una predizione basata sui parametri di input
-        if not self.model: #se il modello non è addestrato
-            self.train_model() #addestra il modello
+    def replay_sample(self, X, y): #righe di training a caso, con almeno una per classe, per gli aggiornamenti dai riscontri
+        rng = np.random.default_rng(42)
+        rows = rng.choice(len(y), size=min(self.replay_samples, len(y)), replace=False)
+        rows = np.union1d(rows, np.unique(y, return_index=True)[1]) #ordinati: da una matrice mappata si leggono solo queste righe
+        return np.column_stack([np.asarray(X[rows]), np.asarray(y[rows])]).astype(np.int32)
+    
+    def prepare_inference(self, state): #ricalcola le strutture derivate di un nuovo stato, prima che riceva traffico
+        if self.use_response_table: #costruisce la tabella delle risposte
+            self.build_response_table(state)
+        if state.explanations is None: #non già caricate dall'artefatto
+            self.build_explanations(state)
+    
+    def publish(self, state): #rende attivo un nuovo stato: le richieste già in corso finiscono con quello precedente
+        previous = self.state
+        self.state = state
+        if previous is not None and previous.version != state.version: #una sola serie attiva per modello
+            metrics.set_gauge('studyai_model_info', 0, model=os.path.basename(self.model_dir), version=previous.version)
+        metrics.set_gauge('studyai_model_info', 1, model=os.path.basename(self.model_dir), version=state.version)
+        self.response_table_hits = 0
+        self.response_table_misses = 0
+        metrics.set_gauge('studyai_training_seconds', state.metadata.get('training_time_s', 0.0))
+        metrics.set_gauge('studyai_model_accuracy', state.metadata.get('accuracy', 0.0))
+        metrics.set_gauge('studyai_model_trees', len(state.flat_forest.roots))
+    
+    def model_predict_proba(self, X, state=None): #probabilità delle classi con il backend di inferenza scelto (X: ndarray di codici)
+        state = state or self.state
+        if self.inference_backend == 'flat':
+            return state.flat_forest.predict_proba(X)
+        if hasattr(state.model, 'feature_names_in_'): #modelli salvati prima dell'addestramento su ndarray
+            import pandas as pd
+            return state.model.predict_proba(pd.DataFrame(X, columns=state.model.feature_names_in_))
+        return state.model.predict_proba(X)
+    
+    def input_grid(self, state=None): #tutte le combinazioni di input (4x8x3x3 = 288): codici e chiavi testuali
+        state = state or self.state
+        vocabularies = [state.encoders[feature].classes_ for feature in state.features] #valori visti durante il training
+        codes = np.array(list(itertools.product(*(range(len(v)) for v in vocabularies))), dtype=np.float32)
+        keys = [tuple(str(vocabulary[int(code)]) for vocabulary, code in zip(vocabularies, row)) for row in codes]
+        return codes, keys
+    
+    def save_model(self, path=None): #salva modello, encoder e metadati in una cartella versionata
+        path = path or self.model_dir
+        state = self.state #lo stato può essere sostituito da un aggiornamento durante il salvataggio
+        os.makedirs(path, exist_ok=True)
+        
+        import joblib
+        files = []
+        def write(name, save): #file temporaneo sostituito in un passo: gli array mappati dal file precedente restano validi
+            tmp_path = os.path.join(path, f'{name}.tmp')
+            save(tmp_path)
+            os.replace(tmp_path, os.path.join(path, name))
+            files.append(name)
+        
+        def write_array(name, array):
+            def save(tmp_path):
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, array)
+            write(name, save)
+        
+        write('model.joblib', lambda tmp_path: joblib.dump(state.model, tmp_path)) #senza compressione, così gli array numpy si possono mappare in memoria
+        for name in FlatForest.ARRAYS + ('weights',): #array della foresta esportata, caricati con np.load(mmap_mode='r')
+            if getattr(state.flat_forest, name) is None: #foresta non compattata: nessun peso
+                continue
+            write_array(f'forest_{name}.npy', getattr(state.flat_forest, name))
+        for name in ('bias', 'contributions'): #spiegazioni precalcolate: al caricamento non serve il modello sklearn
+            write_array(f'explanations_{name}.npy', state.explanations[name])
+        if state.replay is not None: #campione dei dati di training per gli aggiornamenti dai riscontri
+            write_array('replay_codes.npy', state.replay)
+        
+        manifest = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'features': state.features,
+            'vocabularies': {feature: [str(v) for v in state.encoders[feature].classes_] for feature in state.features}, #valori di ogni caratteristica
+            'classes': [str(v) for v in state.encoders['target'].classes_], #metodi di studio in ordine di codifica
+            'model_classes': [int(c) for c in state.model_classes], #classi del modello: servono senza caricare model.joblib
+            'metadata': state.metadata,
+            'files': {name: file_sha256(os.path.join(path, name)) for name in files}
+        }
+        
+        #il manifest è scritto per ultimo e sostituito in un solo passo: un artefatto a metà non viene mai caricato
+        tmp_path = os.path.join(path, 'manifest.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(path, 'manifest.json'))
+        print(f"Modello salvato in {path}")
+    
+    def load_model(self, path=None, mmap=True, verify=True): #carica un artefatto salvato con save_model e lo rende attivo
+        state = self.read_model(path, mmap, verify)
+        self.features = state.features
+        self.prepare_inference(state)
+        self.publish(state)
+    
+    def read_model(self, path=None, mmap=True, verify=True): #stato di un artefatto salvato, senza pubblicarlo
+        path = path or self.model_dir
+        with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        if manifest.get('format_version') not in SUPPORTED_ARTIFACT_VERSIONS:
+            raise ValueError(f"Formato dell'artefatto non supportato: {manifest.get('format_version')}")
+        
+        #aperto prima della verifica: se la cartella riceve un nuovo artefatto, il modello caricato al primo uso resta
+        #quello verificato qui, coerente con la foresta e le spiegazioni di questo stato
+        model_path = os.path.join(path, 'model.joblib')
+        model_file = open(model_path, 'rb')
+        
+        if verify: #controlla che i file non siano corrotti o incompleti
+            for name, checksum in manifest['files'].items():
+                if file_sha256(os.path.join(path, name)) != checksum:
+                    model_file.close()
+                    raise ValueError(f"Checksum non valido per {name}")
+        
+        def load_sklearn_model():
+            import joblib
+            try:
+                try:
+                    unchanged = os.stat(model_path).st_ino == os.fstat(model_file.fileno()).st_ino #file ancora nella cartella
+                except FileNotFoundError:
+                    unchanged = False
+                if unchanged:
+                    return joblib.load(model_path, mmap_mode='r' if mmap else None) #array numpy mappati invece di copiati
+                model_file.seek(0) #sostituito da un artefatto più recente: legge quello di questo stato
+                return joblib.load(model_file)
+            finally:
+                model_file.close()
+        
+        #il backend 'flat' serve le predizioni dagli array della foresta: il modello sklearn (e sklearn stesso) viene
+        #caricato solo quando serve, salvo per gli artefatti che non hanno la foresta esportata o le classi del modello
+        model = None
+        if manifest['format_version'] < 2 or 'model_classes' not in manifest or self.inference_backend != 'flat':
+            model = load_sklearn_model()
+        if manifest['format_version'] >= 2: #le pagine degli array mappati sono condivise tra i processi worker
+            names = [name for name in FlatForest.ARRAYS + ('weights',) if f'forest_{name}.npy' in manifest['files']]
+            flat_forest = FlatForest(**{name: np.load(os.path.join(path, f'forest_{name}.npy'), mmap_mode='r' if mmap else None)
+                                        for name in names})
+        else:
+            flat_forest = FlatForest.from_sklearn(model)
+        
+        encoders = {}
+        for feature, vocabulary in list(manifest['vocabularies'].items()) + [('target', manifest['classes'])]:
+            le = Vocabulary(vocabulary) #ricostruisce l'encoder dal vocabolario salvato
+            if self.encoder_cache is not None: #stesso vocabolario di un modello già caricato: usa il suo encoder
+                le = self.encoder_cache.setdefault((feature, tuple(vocabulary)), le)
+            encoders[feature] = le
+        
+        state = ModelState(model, encoders, flat_forest, manifest['metadata'], manifest['features'],
+                           manifest.get('model_classes'), load_sklearn_model)
+        if 'replay_codes.npy' in manifest['files']:
+            state.replay = np.load(os.path.join(path, 'replay_codes.npy'))
+        if 'explanations_contributions.npy' in manifest['files']:
+            state.explanations = {
+                'n_values': [len(encoders[feature].classes_) for feature in state.features],
+                'bias': np.load(os.path.join(path, 'explanations_bias.npy')),
+                'contributions': np.load(os.path.join(path, 'explanations_contributions.npy'))
+            }
+        print(f"Modello caricato da {path}")
+        return state
+    
+    def load_or_train(self, path=None): #carica l'artefatto se esiste, altrimenti addestra e lo salva
+        path = path or self.model_dir
+        if os.path.exists(os.path.join(path, 'manifest.json')):
+            self.load_model(path)
+        else:
+            metrics.inc('studyai_lazy_trainings_total') #nessun artefatto: il modello viene addestrato su richiesta
+            self.train_model()
+            self.save_model(path)
+    
+    def ensure_model(self): #inizializzazione single-flight: un solo thread carica il modello, gli altri aspettano
+        if self.ready.is_set():
+            return
+        
+        with self.init_lock:
+            if self.ready.is_set(): #un altro thread ha già completato l'inizializzazione
+                return
+            try:
+                if self.state is None: #se il modello non è pronto
+                    self.load_or_train() #carica l'artefatto o addestra il modello
+                self.warm_up()
+            except Exception as e:
+                self.init_error = e
+                raise
+            self.init_error = None
+            self.ready.set()
+    
+    def warm_up(self, state=None): #inferenze di prova per caricare in memoria le pagine del modello prima del traffico
+        state = state or self.state
+        start = time.perf_counter()
+        codes, keys = self.input_grid(state) #tutte le combinazioni
+        
+        self.model_predict_proba(codes, state) #batch: tocca tutti i nodi raggiungibili della foresta
+        for key in keys[:3]: #alcune predizioni singole, come nelle richieste reali
+            probabilities = self.model_predict_proba(self.encode_input(key, state)[None, :], state)[0]
+            method = state.class_names[np.argmax(probabilities)]
+            self.generate_study_plan(method, key[2], key[3])
+        print(f"Warm-up del modello completato in {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    def start_background_init(self): #avvia l'inizializzazione in un thread separato, senza bloccare l'avvio del server
+        def init():
+            try:
+                self.ensure_model()
+            except Exception as e:
+                print(f"Inizializzazione del modello fallita: {e}")
+        
+        init_thread = threading.Thread(target=init, name='model-init')
+        init_thread.daemon = True
+        init_thread.start()
+        return init_thread
+    
+    def artifact_version(self, path=None): #versione dell'artefatto nella cartella, letta dal manifest (None se assente)
+        try:
+            with open(os.path.join(path or self.model_dir, 'manifest.json'), encoding='utf-8') as f:
+                return model_version(json.load(f)['metadata'])
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def smoke_test(self, state): #predizioni di prova su tutte le combinazioni di input prima di pubblicare un nuovo stato
+        if state.features != self.features:
+            raise ValueError(f"Caratteristiche diverse dal modello servito: {state.features}")
+        codes, keys = self.input_grid(state)
+        probabilities = self.model_predict_proba(codes, state)
+        if probabilities.shape != (len(codes), len(state.class_names)):
+            raise ValueError(f"Dimensioni delle probabilità non valide: {probabilities.shape}")
+        if not np.isfinite(probabilities).all() or np.abs(probabilities.sum(axis=1) - 1).max() > 1e-3:
+            raise ValueError('Probabilità non valide (non finite o con somma diversa da 1)')
+        if self.use_response_table and len(state.response_table) != len(keys):
+            raise ValueError('Tabella delle risposte incompleta')
+        
+        #raccomandazioni uguali a quelle del modello corrente, sugli input che entrambi conoscono
+        agreement = None
+        current = self.state
+        if current is not None and list(current.class_names) == list(state.class_names):
+            current_codes, current_keys = self.input_grid(current)
+            index = {key: i for i, key in enumerate(current_keys)}
+            shared = [(i, index[key]) for i, key in enumerate(keys) if key in index]
+            if shared:
+                new_rows, current_rows = map(list, zip(*shared))
+                current_predictions = np.argmax(self.model_predict_proba(current_codes[current_rows], current), axis=1)
+                agreement = float(np.mean(np.argmax(probabilities[new_rows], axis=1) == current_predictions))
+                if agreement < self.reload_min_agreement:
+                    raise ValueError(f"Raccomandazioni uguali al modello corrente solo nel {agreement:.1%} degli input")
+        return {'inputs': len(codes), 'agreement': agreement}
+    
+    def reload_model(self, path=None, force=False):
+        #carica in background l'artefatto pubblicato nella cartella, lo verifica e lo riscalda, poi lo rende attivo con un
+        #solo assegnamento: le richieste non si fermano e lo stato precedente resta disponibile per il rollback
+        path = path or self.model_dir
+        start = time.perf_counter()
+        with self.update_lock: #non in parallelo con un aggiornamento dai riscontri o una compattazione
+            current = self.state
+            try:
+                state = self.read_model(path)
+                if current is not None and state.version == current.version and not force:
+                    return {'reloaded': False, 'version': state.version, 'reason': 'versione già attiva'}
+                self.prepare_inference(state)
+                smoke = self.smoke_test(state)
+                self.warm_up(state)
+            except Exception:
+                metrics.inc('studyai_model_reloads_total', result='failed')
+                raise
+            
+            self.rejected_versions.discard(state.version) #ricaricata esplicitamente: non più esclusa
+            self.previous_state = current
+            self.publish(state)
+        
+        metrics.inc('studyai_model_reloads_total', result='success')
+        metrics.set_gauge('studyai_model_reload_seconds', time.perf_counter() - start)
+        print(f"Modello {state.version} attivo (precedente {current.version if current else None})")
+        return {'reloaded': True, 'version': state.version, 'previous_version': current.version if current else None,
+                'smoke_test': smoke, 'reload_time_s': time.perf_counter() - start}
+    
+    def rollback_model(self): #torna subito allo stato precedente all'ultimo ricaricamento (un secondo rollback lo annulla)
+        with self.update_lock:
+            previous, current = self.previous_state, self.state
+            if previous is None:
+                raise ValueError('Nessun modello precedente a cui tornare')
+            self.rejected_versions.add(current.version)
+            self.rejected_versions.discard(previous.version)
+            self.previous_state = current
+            self.publish(previous)
+        metrics.inc('studyai_model_rollbacks_total')
+        print(f"Rollback al modello {previous.version} (annullato {current.version})")
+        return {'version': previous.version, 'rolled_back_version': current.version}
+    
+    def start_model_watcher(self, interval, reload=None):
+        #ricarica il modello (con reload, se indicato) quando nella cartella viene pubblicato un nuovo artefatto
+        def run():
+            last_seen = None
+            while True:
+                time.sleep(interval)
+                try:
+                    #save_model scrive il manifest per ultimo, con un solo rename: se è cambiato l'artefatto è completo
+                    manifest_stat = os.stat(os.path.join(self.model_dir, 'manifest.json'))
+                except OSError:
+                    continue
+                stamp = (manifest_stat.st_ino, manifest_stat.st_mtime_ns)
+                if stamp == last_seen or not self.ready.is_set():
+                    continue
+                last_seen = stamp
+                version = self.artifact_version()
+                if version is None or version == self.model_version or version in self.rejected_versions:
+                    continue
+                try:
+                    (reload or self.reload_model)()
+                except Exception as e:
+                    print(f"Ricaricamento del modello fallito: {e}")
+        
+        watcher_thread = threading.Thread(target=run, name='model-watcher')
+        watcher_thread.daemon = True
+        watcher_thread.start()
+        return watcher_thread
+    
+    def record_feedback(self, learning_style, subject, time_available, difficulty, study_method):
+        #registra il metodo che ha funzionato per uno studente; i riscontri vengono usati dal prossimo aggiornamento
+        values = (learning_style, subject, time_available, difficulty, study_method)
+        if not all(isinstance(value, str) for value in values):
+            raise ValueError('Parametri mancanti o non validi')
+        self.ensure_model()
+        if study_method not in self.state.class_names:
+            raise ValueError(f"Metodo di studio non riconosciuto: {study_method!r}")
         
-        input_data = pd.DataFrame([[learning_style, subject, time_available, difficulty]], #crea un DataFrame con i dati di input
-                                columns=['learning_style', 'subject', 'time_available', 'difficulty'])
+        with self.feedback_lock: #la finestra scarta da sola i riscontri più vecchi
+            self.feedback.append(values)
+            self.feedback_pending += 1
+        metrics.inc('studyai_feedback_total')
+    
+    def update_model(self, force=False):
+        #aggiornamento incrementale: alcuni alberi nuovi, addestrati sui riscontri recenti, sostituiscono i più vecchi;
+        #il nuovo stato viene preparato a parte e pubblicato con un solo assegnamento, senza fermare le predizioni
+        self.ensure_model()
+        with self.update_lock:
+            with self.feedback_lock:
+                if not self.feedback or (self.feedback_pending < self.min_feedback and not force):
+                    return False
+                rows = list(self.feedback)
+                self.feedback_pending = 0
+            
+            start = time.perf_counter()
+            state = self.state
+            columns = list(zip(*rows))
+            
+            #gli encoder non cambiano: le righe con valori mai visti durante il training vengono scartate
+            X = np.column_stack([self.encode_column(feature, columns[j], state) for j, feature in enumerate(state.features)])
+            method_codes = {str(method): code for code, method in enumerate(state.encoders['target'].classes_)}
+            y = np.fromiter((method_codes.get(method, -1) for method in columns[-1]), dtype=np.int32, count=len(columns[-1]))
+            known = (X >= 0).all(axis=1) & (y >= 0)
+            if known.sum() == 0:
+                raise ValueError('Nessun riscontro utilizzabile con il vocabolario del modello')
+            
+            #esempi di training insieme ai riscontri, così i nuovi alberi vedono tutte le classi: il campione salvato
+            #con il modello; i dati simulati solo per i modelli addestrati su di essi e salvati prima del campione
+            replay = state.replay if self.replay_samples else None
+            if replay is None and self.replay_samples and state.metadata.get('data_source') == 'synthetic':
+                generated = self.generate_training_data(self.replay_samples, seed=int(time.time()))
+                replay = np.column_stack([self.encode_column(name, generated[name].astype(str).tolist(), state)
+                                          for name in state.features] +
+                                         [[method_codes.get(method, -1) for method in generated['study_method'].astype(str)]])
+                replay = replay[(replay >= 0).all(axis=1)]
+            if replay is not None:
+                X = np.concatenate([X, replay[:, :-1]])
+                y = np.concatenate([y, replay[:, -1]])
+                known = np.concatenate([known, np.ones(len(replay), dtype=bool)])
+            
+            from sklearn.ensemble import RandomForestClassifier
+            updates = state.metadata.get('updates', 0) + 1
+            trees = RandomForestClassifier(n_estimators=self.update_trees, random_state=updates)
+            trees.fit(X[known], y[known])
+            if not np.array_equal(trees.classes_, state.model.classes_): #i nuovi alberi devono avere le stesse colonne di probabilità
+                raise ValueError('I riscontri e il campione di training non coprono tutti i metodi di studio')
+            
+            model = copy.copy(state.model) #gli alberi rimasti sono condivisi con il modello precedente
+            model.estimators_ = state.model.estimators_[len(trees.estimators_):] + trees.estimators_
+            model.n_estimators = len(model.estimators_)
+            metadata = dict(state.metadata, updates=updates, updated_at=time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                            feedback_rows=int(known[:len(rows)].sum()), update_time_s=time.perf_counter() - start)
+            
+            forest = FlatForest.from_sklearn(model)
+            if 'compaction' in metadata: #la foresta servita era compattata: lo resta con le stesse impostazioni
+                settings = metadata['compaction']
+                forest, metadata['compaction'] = compact_forest(forest, self.input_grid(state)[0], settings['max_bytes'],
+                                                                settings['leaf_dtype'], settings['tolerance'])
+            new_state = ModelState(model, state.encoders, forest, metadata, state.features)
+            new_state.replay = state.replay
+            self.prepare_inference(new_state)
+            self.warm_up(new_state)
+            self.publish(new_state)
+            
+            metrics.inc('studyai_model_updates_total')
+            metrics.set_gauge('studyai_model_update_seconds', time.perf_counter() - start)
+            print(f"Modello aggiornato con {metadata['feedback_rows']} riscontri in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return True
+    
+    def compact_model(self, max_bytes=None, leaf_dtype='float16', tolerance=0.0): #sostituisce la foresta servita con una compattata
+        self.ensure_model()
+        with self.update_lock: #non in parallelo con un aggiornamento dai riscontri
+            state = self.state
+            codes, _ = self.input_grid(state) #tutte le combinazioni possibili: la deriva è misurata su ogni input
+            forest, report = compact_forest(FlatForest.from_sklearn(state.model), codes, max_bytes, leaf_dtype, tolerance)
+            
+            new_state = ModelState(state.model, state.encoders, forest, dict(state.metadata, compaction=report), state.features)
+            new_state.replay = state.replay
+            self.prepare_inference(new_state)
+            self.warm_up(new_state)
+            self.publish(new_state)
         
-        for feature in input_data.columns: #per ogni caratteristica
-            if feature in self.encoders: #se esiste un encoder per la caratteristica
+        print(f"Foresta compattata: {report['bytes'] / 1024:.1f} KB -> {report['compacted_bytes'] / 1024:.1f} KB, "
+              f"{report['distinct_trees']} alberi distinti su {report['trees']}, {report['compacted_nodes']} nodi su {report['nodes']}")
+        print(f"Deriva: classe uguale nel {report['agreement'] * 100:.1f}% degli input, "
+              f"probabilità max {report['max_abs_drift']:.4f}, media {report['mean_abs_drift']:.5f}")
+        return report
+    
+    def start_feedback_updater(self, interval): #controlla i riscontri ogni interval secondi e aggiorna il modello in background
+        def run():
+            while True:
+                time.sleep(interval)
                 try:
-                    input_data[feature] = self.encoders[feature].transform(input_data[feature]) #codifica la caratteristica
-                except ValueError:
-                    input_data[feature] = 0 #se il valore non è stato visto durante il training, usa il primo valore
+                    self.update_model()
+                except Exception as e:
+                    metrics.inc('studyai_model_update_errors_total')
+                    print(f"Aggiornamento del modello fallito: {e}")
+        
+        updater_thread = threading.Thread(target=run, name='feedback-updater')
+        updater_thread.daemon = True
+        updater_thread.start()
+        return updater_thread
+    
+    def predict(self, learning_style, subject, time_available, difficulty, timer=NULL_TIMER):
+        #a una predizione basata sui parametri di input
+        return self.predict_with_state(learning_style, subject, time_available, difficulty, timer)[:2]
+    
+    def predict_with_state(self, learning_style, subject, time_available, difficulty, timer=NULL_TIMER):
+        #come predict, più lo stato del modello che ha fatto la predizione (per riportarne la versione)
+        self.ensure_model() #carica il modello se non è pronto
+        timer.stage('model_wait')
+        
+        if self.coalescer is not None: #codifica e valutazione insieme alle altre richieste concorrenti
+            probabilities, state = self.coalescer.predict((learning_style, subject, time_available, difficulty))
+            timer.stage('coalesced')
+        else:
+            state = self.state #codifica e valutazione con lo stesso modello, anche se viene sostituito nel frattempo
+            row = self.encode_input((learning_style, subject, time_available, difficulty), state) #codifica senza pandas
+            timer.stage('encode')
+            probabilities = self.model_predict_proba(row[None, :], state)[0] #una sola valutazione della foresta per predizione e probabilità
+        
+        predicted_method = state.class_names[np.argmax(probabilities)] #la classe predetta è quella con probabilità massima
+        method_probabilities = dict(zip(state.class_names, probabilities)) #probabilità per ogni metodo
+        timer.stage('forest')
+        
+        return predicted_method, method_probabilities, state #ritorna il metodo predetto, le probabilità associate e il modello
+    
+    def input_row(self): #riga di input preallocata del thread corrente
+        row = getattr(self.input_buffers, 'row', None)
+        if row is None or len(row) != len(self.features):
+            row = self.input_buffers.row = np.zeros(len(self.features), dtype=np.float32)
+        return row
+    
+    def encode_input(self, values, state=None): #codifica una riga nella riga preallocata, applicando la politica per i valori sconosciuti
+        state = state or self.state
+        row = self.input_row()
+        for i, (feature, value) in enumerate(zip(state.features, values)):
+            try:
+                code = state.feature_codes[feature].get(value)
+            except TypeError: #valori non hashable (es. liste nel JSON)
+                code = None
+            if code is None:
+                metrics.inc('studyai_unknown_values_total', feature=feature)
+                if self.unknown_policy == 'error':
+                    raise ValueError(f"Valore non riconosciuto per {feature}: {value!r}")
+                code = 0 #se il valore non è stato visto durante il training, usa il primo valore
+            row[i] = code
+        return row
+    
+    def encode_column(self, feature, values, state=None): #codifica una colonna con la tabella dei codici, -1 per i valori sconosciuti
+        codes = (state or self.state).feature_codes[feature]
+        return np.fromiter((codes.get(value, -1) for value in values), dtype=np.int32, count=len(values))
+    
+    def encode_records(self, records):
+        #controlla e codifica una lista di record: stato usato da tutto il batch, risultati con gli errori dei record
+        #non validi, indici dei record validi e matrice dei loro codici (None se non ce ne sono)
+        if len(records) > self.max_batch_size:
+            raise ValueError(f"Batch troppo grande: {len(records)} record (massimo {self.max_batch_size})")
+        
+        self.ensure_model() #carica il modello se non è pronto
+        state = self.state #tutto il batch usa lo stesso modello
+        
+        results = [None] * len(records)
+        valid = [] #indici dei record validi
+        for i, record in enumerate(records): #controlla ogni record, un record errato non blocca il batch
+            if not isinstance(record, dict):
+                results[i] = {'success': False, 'error': 'Il record deve essere un oggetto JSON'}
+                continue
+            missing = [feature for feature in self.features if not isinstance(record.get(feature), str)]
+            if missing:
+                results[i] = {'success': False, 'error': f"Parametri mancanti o non validi: {', '.join(missing)}"}
+                continue
+            valid.append(i)
+        
+        if not valid:
+            return state, results, valid, None
+        
+        #codifica tutte le colonne: il modello viene poi valutato una sola volta sull'intera matrice
+        X = np.empty((len(valid), len(self.features)), dtype=np.int32)
+        unknown = np.zeros(len(valid), dtype=bool)
+        for j, feature in enumerate(self.features):
+            codes = self.encode_column(feature, [records[i][feature] for i in valid], state)
+            unknown_count = int(np.count_nonzero(codes < 0))
+            if unknown_count:
+                metrics.inc('studyai_unknown_values_total', unknown_count, feature=feature)
+            unknown |= codes < 0
+            X[:, j] = np.maximum(codes, 0) #se il valore non è stato visto durante il training, usa il primo valore
+        
+        if self.unknown_policy == 'error' and unknown.any(): #i record con valori sconosciuti diventano errori
+            for i in np.asarray(valid)[unknown]:
+                results[i] = {'success': False, 'error': 'Valori non riconosciuti nel record'}
+            valid = [i for i, bad in zip(valid, unknown) if not bad]
+            X = X[~unknown]
+        return state, results, valid, X if valid else None
+    
+    def predict_many(self, records): #predizione per una lista di record con una sola chiamata al modello
+        state, results, valid, X = self.encode_records(records)
+        if not valid:
+            return results
+        
+        probabilities = self.model_predict_proba(X.astype(np.float32), state)
+        methods = state.class_names
+        predictions = np.argmax(probabilities, axis=1)
+        
+        for i, prediction, row_probabilities in zip(valid, predictions, probabilities):
+            record = records[i]
+            results[i] = self.build_response(
+                *(record[feature] for feature in self.features),
+                recommended_method=methods[prediction],
+                probabilities=dict(zip(methods, row_probabilities)),
+                state=state
+            )
+        return results
+    
+    def build_response(self, learning_style, subject, time_available, difficulty, recommended_method=None, probabilities=None,
+                       timer=NULL_TIMER, state=None):
+        #costruisce la risposta completa di /predict (metodo, confidenza, piano, risorse e versione del modello)
+        if recommended_method is None: #se la predizione non è già stata calcolata
+            recommended_method, probabilities, state = self.predict_with_state(learning_style, subject, time_available, difficulty,
+                                                                               timer=timer)
+        state = state or self.state
+        
+        study_plan = self.generate_study_plan(recommended_method, time_available, difficulty) #genera il piano di studio
+        timer.stage('plan')
+        resources = self.resources.get(recommended_method, []) #ottiene le risorse associate al metodo raccomandato
+        timer.stage('resources')
+        
+        return {
+            'success': True,
+            'recommended_method': str(recommended_method),
+            'confidence': float(probabilities[recommended_method]), #confidenza della predizione
+            'study_plan': study_plan,
+            'resources': resources,
+            'all_probabilities': {str(method): float(prob) for method, prob in probabilities.items()},
+            'model_version': state.version
+        }
+    
+    def build_response_table(self, state=None): #precalcola la risposta per ogni combinazione di input possibile
+        state = state or self.state
+        start = time.perf_counter()
+        
+        #tutte le combinazioni valutate con una sola chiamata al modello
+        codes, keys = self.input_grid(state)
+        probabilities = self.model_predict_proba(codes, state)
+        methods = state.class_names
+        
+        table = {}
+        for key, row_probabilities in zip(keys, probabilities):
+            method_probabilities = dict(zip(methods, row_probabilities))
+            recommended_method = methods[np.argmax(row_probabilities)]
+            response = self.build_response(*key, recommended_method=recommended_method, probabilities=method_probabilities,
+                                           state=state)
+            body = (json.dumps(response, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8') #JSON pre-serializzato
+            table[key] = (response, body)
+        
+        state.response_table = table #sostituisce la tabella in un solo passo
+        self.response_table_build_time = time.perf_counter() - start
+        print(f"Tabella delle risposte: {len(table)} combinazioni in {self.response_table_build_time * 1000:.1f} ms")
+    
+    def score_frame(self, df): #raccomandazioni per tutte le righe di un DataFrame, con una sola valutazione della foresta
+        self.ensure_model()
+        state = self.state
+        missing = [feature for feature in state.features if feature not in df.columns]
+        if missing:
+            raise ValueError(f"Colonne mancanti: {', '.join(missing)}")
+        
+        X = np.empty((len(df), len(state.features)), dtype=np.int64)
+        unknown = np.zeros(len(df), dtype=bool)
+        for j, feature in enumerate(state.features):
+            codes = self.encode_column(feature, df[feature].tolist(), state)
+            unknown |= codes < 0
+            X[:, j] = np.maximum(codes, 0) #se il valore non è stato visto durante il training, usa il primo valore
+        
+        #le combinazioni possibili sono poche (288): la foresta valuta solo quelle presenti nel blocco
+        n_values = [len(state.encoders[feature].classes_) for feature in state.features]
+        combinations, inverse = np.unique(np.ravel_multi_index(X.T, n_values), return_inverse=True)
+        grid = np.column_stack(np.unravel_index(combinations, n_values)).astype(np.float32)
+        probabilities = self.model_predict_proba(grid, state)[inverse]
+        predictions = np.argmax(probabilities, axis=1)
+        methods = state.class_names[predictions]
+        
+        plans = {} #il piano dipende solo da (metodo, tempo, difficoltà): calcolato una volta per combinazione
+        def study_plan(method, time_available, difficulty):
+            key = (method, time_available, difficulty)
+            if key not in plans:
+                plans[key] = self.generate_study_plan(*key)
+            return plans[key]
         
-        prediction = self.model.predict(input_data)[0] #fa la predizione
-        predicted_method = self.encoders['target'].inverse_transform([prediction])[0] #decodifica la predizione
+        scored = df.copy()
+        scored['recommended_method'] = methods
+        scored['confidence'] = probabilities[np.arange(len(df)), predictions]
+        scored['study_plan'] = [study_plan(*key) for key in zip(methods, df['time_available'], df['difficulty'])]
+        scored['resources'] = [self.resources.get(method, []) for method in methods]
+        scored['error'] = None
+        if self.unknown_policy == 'error' and unknown.any(): #le righe con valori sconosciuti restano senza raccomandazione
+            scored.loc[unknown, ['recommended_method', 'confidence', 'study_plan', 'resources']] = None
+            scored.loc[unknown, 'error'] = 'Valori non riconosciuti nella riga'
+        return scored
+    
+    def build_explanations(self, state=None): #precalcola i contributi delle caratteristiche per ogni combinazione di input
+        state = state or self.state
+        start = time.perf_counter()
+        
+        #la foresta compattata tiene solo le foglie: in quel caso si spiega la foresta completa da cui è stata ricavata
+        forest = state.flat_forest
+        if len(forest.value) != len(forest.feature):
+            forest = FlatForest.from_sklearn(state.model)
+        codes, _ = self.input_grid(state) #in ordine di np.ravel_multi_index sui codici
+        bias, contributions = forest.contributions(codes)
+        
+        state.explanations = { #sostituito in un solo passo, come la tabella delle risposte
+            'n_values': [len(state.encoders[feature].classes_) for feature in state.features],
+            'bias': bias,
+            'contributions': contributions
+        }
+        print(f"Spiegazioni: {len(codes)} combinazioni in {(time.perf_counter() - start) * 1000:.1f} ms")
+    
+    def explain_many(self, records): #spiegazione delle raccomandazioni di una lista di record, dai contributi precalcolati
+        state, results, valid, X = self.encode_records(records)
+        if not valid:
+            return results
         
-        probabilities = self.model.predict_proba(input_data)[0] #ottiene le probabilità per ogni classe
-        method_probabilities = {}
-        for i, prob in enumerate(probabilities): #per ogni probabilità
-            method = self.encoders['target'].inverse_transform([i])[0] #decodifica la classe
-            method_probabilities[method] = prob #salva la probabilità nel dizionario
+        #si spiega il metodo raccomandato dal modello servito, come /predict; con una foresta compattata i contributi sono
+        #quelli della foresta completa da cui è stata ricavata e la loro somma può differire dalla probabilità servita
+        served = self.model_predict_proba(X.astype(np.float32), state)
+        forest = state.flat_forest
+        exact = self.inference_backend != 'flat' or len(forest.value) == len(forest.feature)
+        explanations = state.explanations
+        for i, index, probabilities in zip(valid, np.ravel_multi_index(X.T, explanations['n_values']), served):
+            contributions = explanations['contributions'][index]
+            prediction = int(np.argmax(probabilities))
+            result = {
+                'success': True,
+                'recommended_method': str(state.class_names[prediction]),
+                'probability': float(probabilities[prediction]), #la stessa di /predict
+                'bias': float(explanations['bias'][prediction]), #probabilità media del metodo, prima di guardare l'input
+                'contributions': {feature: float(value) for feature, value in zip(self.features, contributions[:, prediction])},
+                'exact': exact #True: probability = bias + somma dei contributi
+            }
+            if not exact:
+                result['explained_probability'] = float(explanations['bias'][prediction] + contributions[:, prediction].sum())
+            results[i] = result
+        return results
+    
+    def lookup_response(self, learning_style, subject, time_available, difficulty):
+        #cerca la risposta precalcolata, None se la combinazione non è nella tabella
+        try:
+            entry = self.response_table.get((learning_style, subject, time_available, difficulty))
+        except TypeError: #valori non hashable (es. liste nel JSON)
+            entry = None
         
-        return predicted_method, method_probabilities #ritorna il metodo predetto e le probabilità associate
+        if entry is None:
+            self.response_table_misses += 1
+        else:
+            self.response_table_hits += 1
+        return entry
+    
+    def memory_bytes(self): #stima della memoria del modello caricato: alberi sklearn, foresta servita, risposte e spiegazioni
+        state = self.state
+        if state is None:
+            return 0
+        trees = 0 #alberi sklearn: contano solo se il modello è stato caricato
+        if state.loaded_model is not None:
+            trees = sum(estimator.tree_.__getstate__()['nodes'].nbytes + estimator.tree_.value.nbytes
+                        for estimator in state.loaded_model.estimators_)
+        table = sum(len(body) for _, body in state.response_table.values())
+        explanations = state.explanations['contributions'].nbytes if state.explanations else 0
+        return trees + state.flat_forest.nbytes + table + explanations
+    
+    def response_table_stats(self): #statistiche della tabella delle risposte
+        lookups = self.response_table_hits + self.response_table_misses
+        return {
+            'enabled': self.use_response_table,
+            'size': len(self.response_table),
+            'build_time_ms': self.response_table_build_time * 1000,
+            'hits': self.response_table_hits,
+            'misses': self.response_table_misses,
+            'hit_ratio': self.response_table_hits / lookups if lookups else 0.0
+        }
     
     def generate_study_plan(self, method, time_available, difficulty):
-        #genera il piano di studio personalizzato
-        time_map = {'1-2 horas': 90, '3-4 horas': 210, '5+ horas': 300} #mappa del tempo disponibile in minuti
-        total_minutes = time_map.get(time_available, 120) #ottiene il tempo totale disponibile in minuti, default 120
-        
-        if method == 'Leitura ativa e anotações': #se il metodo è lettura attiva e appunti
-            sessions = [ #imposta le sessioni di studio
-                f"Leitura preliminar (15 min)",
-                f"Leitura aprofundada com anotações ({total_minutes//2} min)",
-                f"Revisão e síntese ({total_minutes//4} min)",
-                f"Revisão final ({total_minutes//4} min)"
-            ]
-        elif method == 'Flashcards e repetição espaçada':
-            sessions = [
-                f"Criação de flashcards ({total_minutes//3} min)",
-                f"Primeira sessão de revisão ({total_minutes//3} min)",
-                f"Revisão espaçada ({total_minutes//3} min)"
-            ]
-        elif method == 'Mapas mentais e conceituais':
-            sessions = [
-                f"Brainstorming de conceitos ({total_minutes//4} min)",
-                f"Criação do mapa mental ({total_minutes//2} min)",
-                f"Revisão e conexões ({total_minutes//4} min)"
-            ]
-        elif method == 'Resolução prática de problemas':
-            sessions = [
-                f"Estudo da teoria básica ({total_minutes//3} min)",
-                f"Resolução de problemas guiados ({total_minutes//2} min)",
-                f"Prática independente ({total_minutes//6} min)"
-            ]
-        elif method == 'Estudo em grupo':
-            sessions = [
-                f"Preparação individual ({total_minutes//4} min)",
-                f"Discussão em grupo ({total_minutes//2} min)",
-                f"Síntese coletiva ({total_minutes//4} min)"
-            ]
-        elif method == 'Vídeos e materiais multimídia':
-            sessions = [
-                f"Visualização de vídeo introdutório ({total_minutes//3} min)",
-                f"Aprofundamento multimídia ({total_minutes//3} min)",
-                f"Revisão ativa ({total_minutes//3} min)"
-            ]
-        elif method == 'Resumos e esquemas':
-            sessions = [
-                f"Leitura e sublinhado ({total_minutes//3} min)",
-                f"Criação de resumo ({total_minutes//2} min)",
-                f"Revisão do esquema ({total_minutes//6} min)"
-            ]
-        else: 
-            sessions = [
-                f"Estudo preparatório ({total_minutes//4} min)",
-                f"Simulação prática ({total_minutes//2} min)",
-                f"Análise de erros ({total_minutes//4} min)"
+        #genera il piano di studio personalizzato: le sessioni del primo giorno, dalla tabella STUDY_SESSIONS
+        total_minutes = TIME_BUDGETS.get(time_available, 120) #ottiene il tempo totale disponibile in minuti, default 120
+        return [f"{label} ({session_minutes(total_minutes, divisor, fixed)} min)"
+                for label, divisor, fixed in STUDY_SESSIONS.get(method, DEFAULT_STUDY_SESSIONS)]
+    
+    def generate_schedule(self, method, time_available, difficulty, subjects, weeks=4):
+        #calendario di più settimane per uno studente: sessioni di studio e ripetizioni a intervalli crescenti
+        schedules = build_schedules([method], [time_available], [difficulty], [subjects], weeks)
+        columns = schedules['columns']
+        return {
+            'weeks': weeks,
+            'daily_minutes': TIME_BUDGETS.get(time_available, 120),
+            'sessions': [
+                {'day': int(day), 'subject': schedules['subjects'][subject], 'session': SESSION_LABELS[session],
+                 'minutes': int(minutes), 'repetition': int(repetition)}
+                for day, subject, session, minutes, repetition in zip(columns['day'], columns['subject'], columns['session'],
+                                                                      columns['minutes'], columns['repetition'])
             ]
-        return sessions
+        }
+    
+    def generate_schedules(self, methods, times_available, difficulties, subjects, weeks=4):
+        #calendari per molti studenti in un solo passaggio (colonne NumPy, vedi build_schedules)
+        return build_schedules(methods, times_available, difficulties, subjects, weeks)
 
 study_system = StudyRecommendationSystem() #inizializza il sistema di raccomandazione
 
+TENANT_PATTERN = re.compile(r'[A-Za-z0-9_-]+') #nomi dei tenant ammessi (es. scuola-rossi, pt_BR): sono nomi di cartella
+
+class ModelRegistry: #un modello per tenant (scuola o lingua), caricato al primo uso e scaricato se usato meno di recente
+    def __init__(self, default, root=None, max_bytes=512 * 2**20):
+        self.default = default #sistema usato per le richieste senza tenant
+        self.root = root #una cartella per tenant con l'artefatto e tenant.json opzionale (default: <model_dir>/tenants)
+        self.max_bytes = max_bytes #memoria massima dei modelli dei tenant; l'ultimo caricato non viene mai scaricato
+        self.lock = threading.Lock()
+        self.systems = collections.OrderedDict() #tenant -> sistema, dal meno al più recentemente usato
+        self.sizes = {} #tenant -> memoria stimata del modello
+        self.loading = {} #tenant -> lock del caricamento, così ogni tenant viene caricato una volta sola
+        self.encoder_cache = weakref.WeakValueDictionary() #(caratteristica, vocabolario) -> encoder condiviso
+    
+    def tenant_dir(self, tenant): #cartella dell'artefatto di un tenant
+        if not TENANT_PATTERN.fullmatch(tenant):
+            raise ValueError(f"Nome del tenant non valido: {tenant!r}")
+        return os.path.join(self.root or os.path.join(self.default.model_dir, 'tenants'), tenant)
+    
+    def get(self, tenant=None): #sistema del tenant, caricato se non è in memoria
+        if not tenant:
+            return self.default
+        if not isinstance(tenant, str):
+            raise ValueError(f"Nome del tenant non valido: {tenant!r}")
+        
+        with self.lock:
+            system = self.systems.get(tenant)
+            if system is not None:
+                self.systems.move_to_end(tenant)
+                return system
+        if not os.path.exists(os.path.join(self.tenant_dir(tenant), 'manifest.json')): #i tenant non vengono addestrati su richiesta
+            raise ValueError(f"Tenant sconosciuto: {tenant}")
+        with self.lock:
+            load_lock = self.loading.setdefault(tenant, threading.Lock())
+        
+        with load_lock: #le richieste concorrenti per lo stesso tenant aspettano il primo caricamento
+            try:
+                with self.lock:
+                    system = self.systems.get(tenant)
+                return system if system is not None else self.load(tenant)
+            finally: #anche se il caricamento fallisce: i nomi ricevuti non restano in memoria
+                with self.lock:
+                    if self.loading.get(tenant) is load_lock:
+                        del self.loading[tenant]
+    
+    def load(self, tenant):
+        path = self.tenant_dir(tenant)
+        if not os.path.exists(os.path.join(path, 'manifest.json')): #i tenant non vengono addestrati su richiesta
+            raise ValueError(f"Tenant sconosciuto: {tenant}")
+        
+        start = time.perf_counter()
+        system = StudyRecommendationSystem()
+        system.model_dir = path
+        system.encoder_cache = self.encoder_cache
+        system.coalescer = None #il thread del coalescer terrebbe in vita il sistema anche dopo lo scaricamento
+        config_path = os.path.join(path, 'tenant.json')
+        config = {}
+        if os.path.exists(config_path): #risorse del tenant
+            with open(config_path, encoding='utf-8') as f:
+                config = json.load(f)
+        system.resources = config.get('resources', system.resources)
+        system.ensure_model()
+        
+        #i metodi raccomandati sono le classi del modello: la configurazione deve parlare degli stessi metodi
+        methods = set(system.state.class_names)
+        if 'study_methods' in config and set(config['study_methods']) != methods:
+            raise ValueError(f"tenant.json di {tenant}: study_methods diversi dalle classi del modello {sorted(methods)}")
+        unknown = sorted(set(config.get('resources', {})) - methods)
+        if unknown:
+            raise ValueError(f"tenant.json di {tenant}: risorse per metodi che il modello non raccomanda: {unknown}")
+        
+        metrics.observe('studyai_registry_load_seconds', time.perf_counter() - start, tenant=tenant)
+        metrics.inc('studyai_registry_loads_total', tenant=tenant)
+        with self.lock:
+            self.systems[tenant] = system
+            self.sizes[tenant] = system.memory_bytes()
+            self.evict()
+        return system
+    
+    def evict(self): #scarica i modelli usati meno di recente finché la memoria non rientra nel budget (con il lock)
+        while sum(self.sizes.values()) > self.max_bytes and len(self.systems) > 1:
+            tenant, _ = self.systems.popitem(last=False) #le richieste in corso finiscono con il sistema che hanno già
+            del self.sizes[tenant]
+            metrics.inc('studyai_registry_evictions_total', tenant=tenant)
+            metrics.set_gauge('studyai_registry_model_resident', 0, tenant=tenant)
+        
+        for tenant in self.systems:
+            metrics.set_gauge('studyai_registry_model_resident', 1, tenant=tenant)
+        metrics.set_gauge('studyai_registry_resident_models', len(self.systems))
+        metrics.set_gauge('studyai_registry_resident_bytes', sum(self.sizes.values()))
+    
+    def stats(self): #tenant in memoria, dal meno al più recentemente usato
+        with self.lock:
+            return {
+                'max_bytes': self.max_bytes,
+                'resident_bytes': sum(self.sizes.values()),
+                'tenants': [{'tenant': tenant, 'bytes': self.sizes[tenant]} for tenant in self.systems]
+            }
+
+model_registry = ModelRegistry(study_system, os.environ.get('STUDYAI_TENANTS_DIR'),
+                               int(float(os.environ.get('STUDYAI_REGISTRY_MAX_MB', 512)) * 2**20))
+
+class AuditLog: #registro append-only delle predizioni: le richieste accodano, un thread scrive su file a blocchi
+    FIELDS = ('ts', 'tenant', 'learning_style', 'subject', 'time_available', 'difficulty', 'recommended_method', 'confidence')
+    
+    def __init__(self, directory, max_queue=10000, batch_size=1000, flush_interval=1.0, max_bytes=64 * 2**20):
+        self.directory = directory #un file per processo (audit-<pid>.jsonl), rinominato con la data quando viene chiuso
+        self.max_queue = max_queue #record in attesa oltre i quali i nuovi vengono scartati invece di bloccare la richiesta
+        self.batch_size = batch_size #record per scrittura
+        self.flush_interval = flush_interval #attesa massima (secondi) prima di scrivere un blocco incompleto
+        self.max_bytes = max_bytes #dimensione oltre la quale il file viene chiuso e ne viene aperto uno nuovo
+        self.lock = threading.Lock()
+        self.queue = None
+        self.thread = None
+        self.pid = None #il thread non sopravvive a fork(): viene riavviato nel processo figlio
+        self.dropped = 0 #record scartati con la coda piena
+    
+    def record(self, tenant, learning_style, subject, time_available, difficulty, recommended_method, confidence):
+        #accoda una predizione senza bloccare: la serializzazione e la scrittura avvengono nel thread
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait((time.time(), tenant, learning_style, subject, time_available, difficulty, recommended_method, confidence))
+        except queue.Full:
+            self.dropped += 1
+            metrics.inc('studyai_audit_dropped_total')
+    
+    def start(self):
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self.queue = queue.Queue(maxsize=self.max_queue)
+            self.thread = threading.Thread(target=self.run, args=(self.queue,), name='audit-writer')
+            self.thread.daemon = True
+            self.thread.start()
+            self.pid = os.getpid()
+    
+    def run(self, entries): #ciclo del thread: scrive quando il blocco è pieno o dopo flush_interval dal primo record
+        path = os.path.join(self.directory, f'audit-{os.getpid()}.jsonl')
+        f = None
+        while True:
+            batch = [entries.get()]
+            deadline = time.perf_counter() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(entries.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            stopping = batch[-1] is None #close(): scrive quello che resta e chiude il file
+            batch = [entry for entry in batch if entry is not None]
+            if batch:
+                start = time.perf_counter()
+                f = f or open(path, 'a', encoding='utf-8')
+                f.write(''.join(json.dumps(dict(zip(self.FIELDS, entry)), ensure_ascii=False, separators=(',', ':')) + '\n'
+                                for entry in batch))
+                f.flush()
+                metrics.inc('studyai_audit_records_total', len(batch))
+                metrics.observe('studyai_audit_write_seconds', time.perf_counter() - start)
+            
+            if f is not None and (stopping or f.tell() >= self.max_bytes):
+                f.close()
+                f = None
+                self.rotate(path)
+            if stopping:
+                return
+    
+    def rotate(self, path): #il file completo prende il nome definitivo, leggibile come dati di training
+        os.replace(path, os.path.join(self.directory, f"audit-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns()}.jsonl"))
+    
+    def close(self, timeout=5.0): #scrive i record in coda e chiude il file corrente
+        if self.pid != os.getpid():
+            return
+        self.queue.put(None) #attende se la coda è piena: alla chiusura nessun record viene scartato
+        self.thread.join(timeout)
+        self.pid = None
+    
+    def files(self): #file chiusi, in ordine di scrittura per processo
+        return sorted(glob.glob(os.path.join(self.directory, 'audit-*-*.jsonl')))
+    
+    def training_source(self, features, chunk_size=1_000_000):
+        #i file chiusi come dati di training: il metodo raccomandato diventa la variabile target
+        return FileDataSource(self.files(), features + ['study_method'], chunk_size, rename={'recommended_method': 'study_method'})
+
+audit_log = AuditLog(os.environ['STUDYAI_AUDIT_DIR']) if os.environ.get('STUDYAI_AUDIT_DIR') else None #registro delle predizioni
+if audit_log is not None:
+    atexit.register(audit_log.close)
+
 #template HTML
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -619,12 +2382,49 @@ HTML_TEMPLATE = """
 </html>
 """
 
+class StaticPage: #pagina renderizzata una sola volta e servita come bytes, con varianti compresse ed ETag
+    def __init__(self, body, mimetype='text/html', max_age=86400):
+        self.mimetype = mimetype
+        self.max_age = max_age #durata della cache del browser in secondi
+        digest = hashlib.sha256(body).hexdigest()[:32] #ETag forte basato sul contenuto
+        
+        self.variants = {'identity': (body, digest)} #codifica -> (bytes, ETag), un ETag per rappresentazione
+        self.variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f'{digest}-gz')
+        if brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), f'{digest}-br')
+    
+    def negotiate(self, accept_encodings, if_none_match): #(stato, intestazioni, corpo), 304 se il client ha già questa versione
+        encoding = accept_encodings.best_match([e for e in ('br', 'gzip', 'identity') if e in self.variants], default='identity')
+        body, etag = self.variants[encoding]
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': f'public, max-age={self.max_age}',
+            'Vary': 'Accept-Encoding'
+        }
+        
+        if if_none_match.contains(etag): #il client ha già questa versione
+            return 304, headers, b''
+        headers['Content-Type'] = f'{self.mimetype}; charset=utf-8'
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, headers, body
+    
+    def response(self): #risposta per la richiesta Flask corrente
+        status, headers, body = self.negotiate(request.accept_encodings, request.if_none_match)
+        return app.response_class(body, status=status, headers=headers)
+
+with app.app_context(): #il template non ha variabili: viene renderizzato una sola volta all'avvio
+    index_page = StaticPage(render_template_string(HTML_TEMPLATE).encode('utf-8'),
+                            max_age=int(os.environ.get('STUDYAI_INDEX_MAX_AGE', 86400)))
+
 @app.route('/') #path principale
-def index(): #renderizza la pagina principale
-    return render_template_string(HTML_TEMPLATE) #
+def index(): #serve la pagina principale pre-renderizzata
+    return index_page.response()
 
 @app.route('/predict', methods=['POST']) #endpoint per le predizioni
 def predict():
+    timer = metrics.timer('predict') #misura le fasi della richiesta
+    metrics.inc('studyai_requests_total', endpoint='predict')
     try:
         data = request.json #ottieni i dati dalla richiesta
         
@@ -633,47 +2433,652 @@ def predict():
         subject = data['subject']
         time_available = data['time_available']
         difficulty = data['difficulty']
+        tenant = data.get('tenant') or request.args.get('tenant')
+        system = model_registry.get(tenant) #modello della scuola o lingua
+        timer.stage('parse')
         
-        #fa la predizione
-        recommended_method, probabilities = study_system.predict(
-            learning_style, subject, time_available, difficulty
-        )
+        if system.use_response_table and system.ready.is_set(): #risposta precalcolata, se disponibile
+            entry = system.lookup_response(learning_style, subject, time_available, difficulty)
+            timer.stage('lookup')
+            if entry is not None:
+                if audit_log is not None:
+                    audit_log.record(tenant, learning_style, subject, time_available, difficulty,
+                                     entry[0]['recommended_method'], entry[0]['confidence'])
+                response = app.response_class(entry[1], mimetype='application/json')
+                timer.finish()
+                return response
         
-        #genera il piano di studio
-        study_plan = study_system.generate_study_plan(
-            recommended_method, time_available, difficulty
-        )
-
-        resources = study_system.resources.get(recommended_method, []) #ottiene le risorse associate al metodo raccomandato
+        #valori non presenti nella tabella: fa la predizione con il modello
+        response = system.build_response(learning_style, subject, time_available, difficulty, timer=timer)
+        if audit_log is not None:
+            audit_log.record(tenant, learning_style, subject, time_available, difficulty,
+                             response['recommended_method'], response['confidence'])
         
-        confidence = probabilities[recommended_method] #ottiene la confidenza della predizione
+        response = jsonify(response) #ritorna i risultati come JSON
+        timer.stage('serialize')
+        timer.finish()
+        return response
         
-        return jsonify({ #ritorna i risultati come JSON
-            'success': True,
-            'recommended_method': recommended_method,
-            'confidence': confidence,
-            'study_plan': study_plan,
-            'resources': resources,
-            'all_probabilities': probabilities
+    except Exception as e:
+        metrics.inc('studyai_errors_total', endpoint='predict')
+        return jsonify({
+            'success': False,
+            'error': str(e)
         })
+
+@app.route('/predict/batch', methods=['POST']) #endpoint per le predizioni di più studenti in una richiesta
+def predict_batch():
+    timer = metrics.timer('predict_batch')
+    metrics.inc('studyai_requests_total', endpoint='predict_batch')
+    data = request.get_json(silent=True) #ottieni i dati dalla richiesta
+    records = data.get('records') if isinstance(data, dict) else data #accetta sia {"records": [...]} che [...]
+    
+    if not isinstance(records, list):
+        metrics.inc('studyai_errors_total', endpoint='predict_batch')
+        return jsonify({
+            'success': False,
+            'error': 'Il corpo della richiesta deve contenere una lista di record'
+        }), 400
+    
+    if len(records) > study_system.max_batch_size:
+        metrics.inc('studyai_errors_total', endpoint='predict_batch')
+        return jsonify({
+            'success': False,
+            'error': f"Batch troppo grande: {len(records)} record (massimo {study_system.max_batch_size})"
+        }), 413
+    
+    try:
+        tenant = (data.get('tenant') if isinstance(data, dict) else None) or request.args.get('tenant')
+        system = model_registry.get(tenant)
+    except ValueError as e: #tenant sconosciuto o nome non valido
+        metrics.inc('studyai_errors_total', endpoint='predict_batch')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    
+    timer.stage('parse')
+    
+    try:
+        results = system.predict_many(records)
+    except Exception as e:
+        metrics.inc('studyai_errors_total', endpoint='predict_batch')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    timer.stage('predict_many')
+    
+    if audit_log is not None:
+        for record, result in zip(records, results):
+            if result['success']:
+                audit_log.record(tenant, *(record[feature] for feature in system.features),
+                                 result['recommended_method'], result['confidence'])
+    
+    errors = sum(1 for result in results if not result['success'])
+    metrics.inc('studyai_batch_records_total', len(results))
+    if errors:
+        metrics.inc('studyai_batch_record_errors_total', errors)
+    
+    response = jsonify({ #ritorna un risultato per ogni record, nello stesso ordine
+        'success': True,
+        'count': len(results),
+        'errors': errors,
+        'results': results
+    })
+    timer.stage('serialize')
+    timer.finish()
+    return response
+
+@app.route('/explain', methods=['POST']) #contributo di ogni caratteristica alla raccomandazione
+def explain():
+    metrics.inc('studyai_requests_total', endpoint='explain')
+    try:
+        data = request.json #ottieni i dati dalla richiesta
+        system = model_registry.get(data.get('tenant') or request.args.get('tenant'))
+        result = system.explain_many([data])[0]
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+    if not result['success']:
+        metrics.inc('studyai_errors_total', endpoint='explain')
+    return jsonify(result)
+
+@app.route('/explain/batch', methods=['POST']) #spiegazioni di più studenti in una richiesta, per i report
+def explain_batch():
+    metrics.inc('studyai_requests_total', endpoint='explain_batch')
+    data = request.get_json(silent=True) #ottieni i dati dalla richiesta
+    records = data.get('records') if isinstance(data, dict) else data #accetta sia {"records": [...]} che [...]
+    
+    if not isinstance(records, list):
+        metrics.inc('studyai_errors_total', endpoint='explain_batch')
+        return jsonify({
+            'success': False,
+            'error': 'Il corpo della richiesta deve contenere una lista di record'
+        }), 400
+    
+    try:
+        tenant = (data.get('tenant') if isinstance(data, dict) else None) or request.args.get('tenant')
+        results = model_registry.get(tenant).explain_many(records)
+    except Exception as e:
+        metrics.inc('studyai_errors_total', endpoint='explain_batch')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    return jsonify({ #un risultato per ogni record, nello stesso ordine
+        'success': True,
+        'count': len(results),
+        'errors': sum(1 for result in results if not result['success']),
+        'results': results
+    })
+
+MAX_SCHEDULE_WEEKS = 52
+MAX_SCHEDULE_SUBJECTS = 20
+
+@app.route('/schedule', methods=['POST']) #calendario di più settimane con ripetizioni spaziate
+def schedule():
+    timer = metrics.timer('schedule')
+    metrics.inc('studyai_requests_total', endpoint='schedule')
+    try:
+        data = request.json #ottieni i dati dalla richiesta
+        learning_style = data['learning_style']
+        subject = data['subject']
+        time_available = data['time_available']
+        difficulty = data['difficulty']
+        subjects = data.get('subjects') or [subject] #tutte le materie dello studente, di default solo quella indicata
+        if not isinstance(subjects, list) or not all(isinstance(name, str) and name for name in subjects):
+            raise ValueError('subjects deve essere una lista di nomi di materie')
+        if len(subjects) > MAX_SCHEDULE_SUBJECTS:
+            raise ValueError(f"Troppe materie: {len(subjects)} (al massimo {MAX_SCHEDULE_SUBJECTS})")
+        weeks = int(data.get('weeks', 4))
+        if not 1 <= weeks <= MAX_SCHEDULE_WEEKS:
+            raise ValueError(f"Numero di settimane non valido: {weeks} (da 1 a {MAX_SCHEDULE_WEEKS})")
+        system = model_registry.get(data.get('tenant') or request.args.get('tenant'))
+        timer.stage('parse')
+        
+        response = system.build_response(learning_style, subject, time_available, difficulty, timer=timer)
+        response['schedule'] = system.generate_schedule(response['recommended_method'], time_available, difficulty,
+                                                        list(dict.fromkeys(subjects)), weeks)
+        timer.stage('schedule')
+        response = jsonify(response)
+        timer.finish()
+        return response
         
     except Exception as e:
+        metrics.inc('studyai_errors_total', endpoint='schedule')
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+def feedback_disabled(): #con più worker ognuno aggiornerebbe il proprio modello: risposte diverse per lo stesso input
+    if app.config.get('STUDYAI_WORKERS', 1) > 1:
+        return jsonify({
+            'success': False,
+            'error': "Aggiornamento dai riscontri non disponibile con più worker: usare serve --workers 1"
+        }), 409
+    return None
+
+@app.route('/feedback', methods=['POST']) #riscontri degli studenti: il metodo di studio che ha funzionato
+def feedback():
+    metrics.inc('studyai_requests_total', endpoint='feedback')
+    disabled = feedback_disabled()
+    if disabled:
+        return disabled
+    data = request.get_json(silent=True)
+    records = data.get('records', data) if isinstance(data, dict) else data #un oggetto, {"records": [...]} oppure [...]
+    if isinstance(records, dict):
+        records = [records]
+    
+    if not isinstance(records, list):
+        metrics.inc('studyai_errors_total', endpoint='feedback')
+        return jsonify({
+            'success': False,
+            'error': 'Il corpo della richiesta deve contenere un riscontro o una lista di riscontri'
+        }), 400
+    
+    rejected = [] #un riscontro errato non blocca gli altri
+    for i, record in enumerate(records):
+        try:
+            study_system.record_feedback(*(record.get(field) for field in study_system.features + ['study_method']))
+        except Exception as e:
+            rejected.append({'index': i, 'error': str(e)})
+    
+    return jsonify({
+        'success': True,
+        'accepted': len(records) - len(rejected),
+        'rejected': rejected,
+        'pending': study_system.feedback_pending
+    })
+
+@app.route('/feedback/update', methods=['POST']) #aggiorna subito il modello con i riscontri raccolti
+def feedback_update():
+    denied = admin_denied() or feedback_disabled()
+    if denied:
+        return denied
+    try:
+        updated = study_system.update_model(force=True)
+    except Exception as e:
+        metrics.inc('studyai_model_update_errors_total')
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    return jsonify({
+        'success': True,
+        'updated': updated,
+        'metadata': study_system.training_metadata
+    })
+
+@app.route('/tenants') #modelli dei tenant attualmente in memoria
+def tenants():
+    return jsonify(model_registry.stats())
+
+@app.route('/predict/table') #statistiche della tabella delle risposte precalcolate
+def predict_table():
+    return jsonify(study_system.response_table_stats())
+
+@app.route('/ready') #readiness probe per il load balancer
+def ready():
+    if study_system.ready.is_set():
+        return jsonify({'ready': True, 'model_version': study_system.model_version})
+    
+    status = {'ready': False}
+    if study_system.init_error is not None:
+        status['error'] = str(study_system.init_error)
+    return jsonify(status), 503 #non ancora servibile
+
+ADMIN_TOKEN = os.environ.get('STUDYAI_ADMIN_TOKEN') #richiesto nell'intestazione X-Admin-Token; senza, le route di amministrazione sono disattivate
+
+def admin_denied(): #risposta 403 se il token di amministrazione manca o non corrisponde, None se la richiesta è autorizzata
+    if not ADMIN_TOKEN:
+        return jsonify({'success': False, 'error': 'Route di amministrazione disattivate: impostare STUDYAI_ADMIN_TOKEN'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'success': False, 'error': 'Token di amministrazione non valido'}), 403
+    return None
+
+@app.route('/admin/model') #versione del modello servito, di quello pubblicato nella cartella e di quello per il rollback
+def admin_model():
+    denied = admin_denied()
+    if denied:
+        return denied
+    previous = study_system.previous_state
+    return jsonify({
+        'version': study_system.model_version,
+        'artifact_version': study_system.artifact_version(),
+        'previous_version': previous.version if previous else None,
+        'rejected_versions': sorted(study_system.rejected_versions),
+        'metadata': study_system.training_metadata
+    })
+
+@app.route('/admin/reload', methods=['POST']) #carica l'artefatto pubblicato nella cartella del modello
+def admin_reload():
+    return model_admin_action(signal.SIGHUP)
+
+@app.route('/admin/rollback', methods=['POST']) #torna al modello precedente all'ultimo ricaricamento
+def admin_rollback():
+    return model_admin_action(signal.SIGUSR1)
+
+def model_admin_action(signum):
+    denied = admin_denied()
+    if denied:
+        return denied
+    master_pid = app.config.get('STUDYAI_MASTER_PID')
+    if master_pid is not None: #server pre-fork: il master inoltra il segnale a tutti i worker, non solo a questo
+        os.kill(master_pid, signum)
+        return jsonify({'success': True, 'scheduled': True}), 202
+    try:
+        result = study_system.reload_model() if signum == signal.SIGHUP else study_system.rollback_model()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409 if isinstance(e, ValueError) else 500
+    return jsonify(dict(result, success=True))
+
+@app.route('/metrics') #metriche in formato testo Prometheus
+def metrics_endpoint():
+    if not metrics.enabled:
+        return app.response_class('metriche disattivate (STUDYAI_METRICS=0)\n', status=404, mimetype='text/plain')
+    
+    stats = study_system.response_table_stats() #valori letti al momento della richiesta
+    metrics.set_gauge('studyai_model_ready', int(study_system.ready.is_set()))
+    metrics.set_gauge('studyai_response_table_size', stats['size'])
+    metrics.set_gauge('studyai_response_table_hits', stats['hits'])
+    metrics.set_gauge('studyai_response_table_misses', stats['misses'])
+    metrics.set_gauge('studyai_response_table_build_seconds', stats['build_time_ms'] / 1000)
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+class ServerBusy(Exception): #tutti i posti per le valutazioni del modello sono occupati oltre il timeout
+    pass
+
+class AsyncFrontend: #applicazione ASGI: / e /predict serviti dall'event loop, le altre route passano all'app Flask
+    def __init__(self, concurrency=64, timeout=10.0, threads=4):
+        self.concurrency = concurrency #valutazioni del modello contemporanee: le richieste oltre il limite attendono un posto
+        self.timeout = timeout #secondi massimi per una richiesta, attesa del posto compresa
+        self.threads = threads #thread del pool che esegue il modello e le route Flask
+        self.executor = None
+        self.slots = None
+        self.loop = None #pool e semaforo appartengono a un event loop (e a un processo)
+    
+    def start(self): #pool e semaforo per l'event loop corrente
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='async-frontend')
+            self.slots = asyncio.Semaphore(self.concurrency)
+            self.loop = loop
+    
+    async def offload(self, function, *args): #esegue function nel pool, entro il limite di concorrenza e il timeout
+        self.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise ServerBusy() from None
+        
+        #il posto si libera quando il thread ha finito, anche se la richiesta è già scaduta
+        future = loop.run_in_executor(self.executor, function, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        return await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0))
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan': #avvio e arresto sotto un server ASGI esterno (es. uvicorn)
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    study_system.start_background_init()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    if self.executor is not None:
+                        self.executor.shutdown(wait=False)
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+        
+        body = b''
+        while True: #corpo della richiesta, anche se arriva in più parti
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        
+        method, path = scope['method'], scope['path']
+        headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+        if path == '/' and method in ('GET', 'HEAD'):
+            status, response_headers, body = index_page.negotiate(parse_accept_header(headers.get('accept-encoding')),
+                                                                  parse_etags(headers.get('if-none-match')))
+            response_headers = list(response_headers.items())
+        elif path == '/predict' and method == 'POST':
+            status, response_headers, body = await self.predict(body, scope['query_string'].decode('latin-1'))
+        else:
+            try:
+                status, response_headers, body = await self.offload(self.call_wsgi, scope, body)
+            except ServerBusy:
+                status, response_headers, body = self.error(503, 'Troppe richieste in corso, riprovare più tardi')
+            except asyncio.TimeoutError:
+                status, response_headers, body = self.error(504, 'Tempo massimo della richiesta superato')
+        
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in response_headers]})
+        await send({'type': 'http.response.body', 'body': body})
+    
+    def error(self, status, message): #risposta di errore nello stesso formato JSON delle route Flask
+        metrics.inc('studyai_async_rejected_total', status=str(status))
+        return status, [('Content-Type', 'application/json'), ('Retry-After', '1')], \
+            (json.dumps({'success': False, 'error': message}) + '\n').encode('utf-8')
+    
+    async def predict(self, body, query_string): #stesso contratto di /predict: risposte precalcolate senza lasciare l'event loop
+        timer = metrics.timer('predict')
+        metrics.inc('studyai_requests_total', endpoint='predict')
+        try:
+            data = json.loads(body)
+            learning_style = data['learning_style']
+            subject = data['subject']
+            time_available = data['time_available']
+            difficulty = data['difficulty']
+            tenant = data.get('tenant') or parse_qs(query_string).get('tenant', [None])[0]
+            system = await self.offload(model_registry.get, tenant) if tenant else study_system #un tenant può dover essere caricato
+            timer.stage('parse')
+            
+            response = None
+            if system.use_response_table and system.ready.is_set(): #risposta precalcolata, se disponibile
+                entry = system.lookup_response(learning_style, subject, time_available, difficulty)
+                timer.stage('lookup')
+                if entry is not None:
+                    response, body = entry
+            if response is None and system.coalescer is not None and system.ready.is_set():
+                #micro-batching: l'attesa della finestra avviene sull'event loop, senza occupare un thread del pool
+                values = (learning_style, subject, time_available, difficulty)
+                probabilities, state = await asyncio.wait_for(system.coalescer.predict_async(values), self.timeout)
+                timer.stage('coalesced')
+                response = system.build_response(*values, recommended_method=state.class_names[np.argmax(probabilities)],
+                                                 probabilities=dict(zip(state.class_names, probabilities)), state=state)
+                body = (json.dumps(response, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+            elif response is None: #valori non presenti nella tabella: il modello viene valutato nel pool di thread
+                response = await self.offload(system.build_response, learning_style, subject, time_available, difficulty)
+                body = (json.dumps(response, sort_keys=True, separators=(',', ':')) + '\n').encode('utf-8')
+            if audit_log is not None:
+                audit_log.record(tenant, learning_style, subject, time_available, difficulty,
+                                 response['recommended_method'], response['confidence'])
+            timer.stage('serialize')
+            timer.finish()
+            return 200, [('Content-Type', 'application/json')], body
+        
+        except ServerBusy:
+            metrics.inc('studyai_errors_total', endpoint='predict')
+            return self.error(503, 'Troppe richieste in corso, riprovare più tardi')
+        except asyncio.TimeoutError:
+            metrics.inc('studyai_errors_total', endpoint='predict')
+            return self.error(504, 'Tempo massimo della richiesta superato')
+        except Exception as e:
+            metrics.inc('studyai_errors_total', endpoint='predict')
+            return 200, [('Content-Type', 'application/json')], \
+                (json.dumps({'success': False, 'error': str(e)}) + '\n').encode('utf-8')
+    
+    def call_wsgi(self, scope, body): #esegue l'app Flask per una richiesta ASGI (in un thread del pool)
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': '',
+            'PATH_INFO': scope['path'],
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False
+        }
+        for name, value in scope['headers']:
+            key = name.decode('latin-1').upper().replace('-', '_')
+            key = key if key in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{key}'
+            environ[key] = f'{environ[key]},{value.decode("latin-1")}' if key in environ else value.decode('latin-1')
+        
+        response = []
+        def start_response(status, headers, exc_info=None):
+            response[:] = [int(status.split(' ', 1)[0]), headers]
+        
+        result = app(environ, start_response)
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return response[0], response[1], body
+
+asgi_app = AsyncFrontend( #es. uvicorn schoolAI:asgi_app, oppure python schoolAI.py serve --async
+    concurrency=int(os.environ.get('STUDYAI_ASYNC_CONCURRENCY', 64)),
+    timeout=float(os.environ.get('STUDYAI_REQUEST_TIMEOUT_S', 10)),
+    threads=int(os.environ.get('STUDYAI_ASYNC_THREADS', 4))
+)
+
+class AsyncHTTPServer: #server HTTP/1.1 minimo su asyncio per un'app ASGI: una coroutine per connessione, nessun thread
+    def __init__(self, app, keepalive_timeout=75.0, body_timeout=30.0, max_body=1024 * 1024, access_log=False):
+        self.app = app
+        self.keepalive_timeout = keepalive_timeout #secondi di attesa della prossima richiesta (e delle sue intestazioni)
+        self.body_timeout = body_timeout #secondi concessi per ricevere il corpo
+        self.max_body = max_body #corpo massimo accettato in byte
+        self.access_log = access_log
+        self.connections = {} #writer della connessione -> True mentre serve una richiesta
+        self.tasks = set() #coroutine delle connessioni aperte
+        self.stopping = None
+    
+    async def serve(self, sock=None, host=None, port=None): #serve finché non viene chiamato stop()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.handle, host, port, sock=sock, backlog=4096)
+        async with server:
+            await self.stopping.wait()
+        
+        #le connessioni inattive vengono chiuse subito, quelle con una richiesta in corso dopo la risposta
+        for writer, busy in list(self.connections.items()):
+            if not busy:
+                writer.close()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+    
+    def stop(self):
+        self.stopping.set()
+    
+    async def handle(self, reader, writer): #una connessione keep-alive: richieste servite una dopo l'altra
+        task = asyncio.current_task()
+        self.tasks.add(task)
+        self.connections[writer] = False
+        try:
+            while not self.stopping.is_set():
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    break
+                self.connections[writer] = True
+                keep_alive = await self.handle_request(head, reader, writer)
+                self.connections[writer] = False
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError): #client lento o disconnesso
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            self.tasks.discard(task)
+            writer.close()
+    
+    async def handle_request(self, head, reader, writer): #legge una richiesta, chiama l'app e scrive la risposta
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+            headers = [(name.strip().lower(), value.strip()) for name, _, value in (line.partition(':') for line in lines[1:] if line)]
+            fields = dict(headers)
+            length = int(fields.get('content-length', 0))
+            if length < 0:
+                raise ValueError(f'Content-Length negativo: {length}')
+        except ValueError:
+            await self.write(writer, 400, [], b'', False)
+            return False
+        if 'chunked' in fields.get('transfer-encoding', ''): #i client dell'API mandano sempre Content-Length
+            await self.write(writer, 411, [], b'', False)
+            return False
+        if length > self.max_body:
+            await self.write(writer, 413, [], b'', False)
+            return False
+        body = await asyncio.wait_for(reader.readexactly(length), self.body_timeout) if length else b''
+        
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': version[5:],
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            'client': writer.get_extra_info('peername'),
+            'server': writer.get_extra_info('sockname')
+        }
+        
+        received = False
+        async def receive():
+            nonlocal received
+            if received: #l'app non aspetta la disconnessione: la risposta viene scritta dopo il ritorno
+                return {'type': 'http.disconnect'}
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        
+        response = {'status': 500, 'headers': [], 'body': []}
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in message.get('headers', [])]
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+        
+        connection = fields.get('connection', '').lower()
+        keep_alive = (connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive') and not self.stopping.is_set()
+        try:
+            await self.app(scope, receive, send)
+        except Exception: #un errore dell'app non deve chiudere la connessione senza risposta
+            traceback.print_exc()
+            response = {'status': 500, 'headers': [('Content-Type', 'application/json')],
+                        'body': [json.dumps({'success': False, 'error': 'Errore interno del server'}).encode()]}
+            keep_alive = False
+        body = b''.join(response['body'])
+        await self.write(writer, response['status'], response['headers'], b'' if method == 'HEAD' else body, keep_alive, len(body))
+        if self.access_log:
+            print(f'{scope["client"][0] if scope["client"] else "-"} - - [{time.strftime("%d/%b/%Y %H:%M:%S")}] '
+                  f'"{lines[0]}" {response["status"]} -', file=sys.stderr)
+        return keep_alive
+    
+    async def write(self, writer, status, headers, body, keep_alive, length=None):
+        lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}']
+        lines += [f'{name}: {value}' for name, value in headers if name.lower() not in ('content-length', 'connection')]
+        lines.append(f'Content-Length: {len(body) if length is None else length}')
+        lines.append(f'Connection: {"keep-alive" if keep_alive else "close"}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+UPDATE_INTERVAL = float(os.environ.get('STUDYAI_UPDATE_INTERVAL_S', 0)) #secondi tra i controlli dei riscontri, 0 disattiva
+RELOAD_INTERVAL = float(os.environ.get('STUDYAI_RELOAD_INTERVAL_S', 0)) #secondi tra i controlli della cartella del modello, 0 disattiva
+
+def apply_model_signal(signum): #SIGHUP: ricarica il modello dalla cartella, SIGUSR1: torna al modello precedente
+    try:
+        if signum == signal.SIGHUP:
+            study_system.reload_model()
+        else:
+            study_system.rollback_model()
+    except Exception as e:
+        print(f"{'Ricaricamento' if signum == signal.SIGHUP else 'Rollback'} del modello fallito: {e}")
+
+def handle_model_signal(signum, frame=None): #in un thread separato: le richieste continuano durante il caricamento
+    threading.Thread(target=apply_model_signal, args=(signum,), name='model-reload', daemon=True).start()
+
+def start_model_maintenance(watch=True): #aggiornamenti dai riscontri, controllo della cartella e segnali di ricaricamento/rollback
+    if UPDATE_INTERVAL > 0: #aggiornamenti incrementali dai riscontri
+        study_system.start_feedback_updater(UPDATE_INTERVAL)
+    if RELOAD_INTERVAL > 0 and watch: #nuovi artefatti pubblicati nella cartella del modello
+        study_system.start_model_watcher(RELOAD_INTERVAL)
+    signal.signal(signal.SIGHUP, handle_model_signal)
+    signal.signal(signal.SIGUSR1, handle_model_signal)
+
 def open_browser(): #apre il browser
+    import webbrowser
     time.sleep(1.0)  #attende che il server sia avviato
     webbrowser.open('http://127.0.0.1:5000/') #apre l'URL nel browser predefinito
 
-if __name__ == '__main__':
+def run_dev_server(): #server di sviluppo con debugger, come in origine
     print("Inizializzazione Sistema AI per Raccomandazione Metodi di Studio...")
     
-    #addestra il modello
-    print("Training del modello AI in corso...")
-    study_system.train_model()
-    print("Modello AI addestrato con successo!")
+    #carica il modello salvato (oppure lo addestra) e lo riscalda in background; /ready risponde 503 fino al termine
+    print("Caricamento del modello AI in corso...")
+    study_system.start_background_init()
+    start_model_maintenance()
     
     #avvia il browser in un thread separato
     browser_thread = threading.Thread(target=open_browser)
@@ -685,4 +3090,290 @@ if __name__ == '__main__':
     print("URL: http://127.0.0.1:5000/")
     
     #avvia l'applicazione Flask
-    app.run(debug=True, use_reloader=False, host='127.0.0.1', port=5000)
\ No newline at end of file
+    app.run(debug=True, use_reloader=False, host='127.0.0.1', port=5000)
+
+def run_worker(listen_socket, host, port, access_log): #processo worker: serve richieste sul socket condiviso
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    
+    class RequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs): #il log di ogni richiesta costa tempo: solo se richiesto
+            if access_log:
+                super().log_request(*args, **kwargs)
+    
+    server = make_server(host, port, app, threaded=True, request_handler=RequestHandler, fd=listen_socket.fileno())
+    server.daemon_threads = False #server_close attende la fine delle richieste in corso
+    
+    def stop(signum, frame): #shutdown() aspetta la fine di serve_forever: va chiamato da un altro thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN) #Ctrl+C arriva al master, che termina i worker con SIGTERM
+    start_model_maintenance(watch=False) #la cartella del modello è controllata dal master, che avvisa tutti i worker
+    server.serve_forever()
+    server.server_close()
+    if audit_log is not None: #os._exit salta atexit: il worker chiude il registro da solo
+        audit_log.close()
+
+def raise_open_files_limit(): #ogni connessione keep-alive tiene aperto un descrittore: usa il limite massimo consentito
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def run_async_worker(listen_socket, host, port, access_log): #processo worker asyncio: migliaia di connessioni senza un thread ciascuna
+    raise_open_files_limit()
+    server = AsyncHTTPServer(asgi_app, access_log=access_log)
+    
+    async def serve():
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.stop)
+        await server.serve(sock=listen_socket)
+    
+    signal.signal(signal.SIGINT, signal.SIG_IGN) #Ctrl+C arriva al master, che termina i worker con SIGTERM
+    start_model_maintenance(watch=False) #la cartella del modello è controllata dal master, che avvisa tutti i worker
+    asyncio.run(serve())
+    if audit_log is not None: #os._exit salta atexit: il worker chiude il registro da solo
+        audit_log.close()
+
+def run_production_server(host, port, workers, graceful_timeout=30.0, access_log=False, worker=run_worker):
+    #server pre-fork: il modello viene caricato una sola volta nel master e condiviso copy-on-write con i worker
+    print(f"Caricamento del modello AI da {study_system.model_dir}...")
+    study_system.ensure_model()
+    
+    listen_socket = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind((host, port))
+    listen_socket.listen(1024)
+    listen_socket.set_inheritable(True)
+    
+    #sposta gli oggetti esistenti nella generazione permanente: il GC dei worker non li tocca e le pagine restano condivise
+    gc.collect()
+    gc.freeze()
+    
+    children = {}
+    stopping = False
+    
+    def spawn():
+        pid = os.fork()
+        if pid == 0: #processo figlio
+            app.config['STUDYAI_MASTER_PID'] = master_pid #le route /admin chiedono al master di avvisare tutti i worker
+            app.config['STUDYAI_WORKERS'] = workers
+            try:
+                worker(listen_socket, host, port, access_log)
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    def forward(signum, frame): #ricaricamento o rollback del modello: a tutti i worker e al master stesso
+        model_signals.append(signum)
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+    
+    master_pid = os.getpid()
+    model_signals = [] #segnali da applicare al modello del master, da cui partono i worker riavviati
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, forward)
+    signal.signal(signal.SIGUSR1, forward)
+    
+    for _ in range(workers):
+        spawn()
+    if RELOAD_INTERVAL > 0: #un nuovo artefatto viene ricaricato come con SIGHUP: dal master e da tutti i worker
+        study_system.start_model_watcher(RELOAD_INTERVAL, lambda: forward(signal.SIGHUP, None))
+    print(f"Server in ascolto su http://{host}:{port}/ con {workers} worker (pid master {os.getpid()})")
+    
+    deadline = None
+    while children:
+        if stopping and deadline is None:
+            deadline = time.monotonic() + graceful_timeout
+        if deadline is not None and time.monotonic() > deadline: #i worker non hanno finito in tempo
+            for pid in list(children):
+                os.kill(pid, signal.SIGKILL)
+        while model_signals and not stopping:
+            apply_model_signal(model_signals.pop(0))
+        
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            time.sleep(0.1)
+            continue
+        
+        children.pop(pid, None)
+        if not stopping: #un worker è terminato in modo inatteso: lo sostituisce
+            print(f"Worker {pid} terminato (stato {status}), riavvio")
+            spawn()
+    
+    listen_socket.close()
+    print("Server arrestato")
+
+def read_record_chunks(path, chunk_size): #righe di un file CSV o JSON Lines, a blocchi, con tutte le colonne
+    import pandas as pd
+    if path.endswith(('.jsonl', '.ndjson')):
+        return pd.read_json(path, lines=True, dtype=False, chunksize=chunk_size)
+    return pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size)
+
+def init_scoring_worker(model_dir): #processo del pool: con fork il modello è già in memoria, altrimenti viene caricato
+    study_system.model_dir = model_dir
+    study_system.ensure_model()
+
+def score_chunk(chunk, output_format, header): #valuta un blocco e lo serializza nel processo worker
+    scored = study_system.score_frame(chunk)
+    if output_format == 'jsonl':
+        text = scored.to_json(orient='records', lines=True, force_ascii=False)
+        return len(scored), text if text.endswith('\n') else text + '\n'
+    scored['study_plan'] = [' | '.join(plan) if plan else '' for plan in scored['study_plan']] #liste in una sola cella
+    scored['resources'] = [', '.join(resources) if resources else '' for resources in scored['resources']]
+    return len(scored), scored.to_csv(index=False, header=header)
+
+def ordered_map(executor, function, iterable, window): #come executor.map, ma con al massimo window blocchi in corso
+    pending = collections.deque()
+    for args in iterable:
+        pending.append(executor.submit(function, *args))
+        if len(pending) >= window: #i blocchi già letti non si accumulano: la memoria non dipende dalla dimensione del file
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def run_bulk_scoring(args): #comando score: raccomandazioni per tutte le righe di un file, scritte nello stesso ordine
+    study_system.ensure_model()
+    output_format = 'jsonl' if args.output.endswith(('.jsonl', '.ndjson')) else 'csv'
+    tasks = ((chunk, output_format, i == 0) for i, chunk in enumerate(read_record_chunks(args.input, args.chunk_size)))
+    
+    start = time.perf_counter()
+    rows = 0
+    with open(args.output, 'w', encoding='utf-8', newline='') as out:
+        if args.jobs == 1:
+            results = (score_chunk(*task) for task in tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=args.jobs, initializer=init_scoring_worker, initargs=(study_system.model_dir,))
+            results = ordered_map(executor, score_chunk, tasks, args.jobs * 2)
+        
+        try:
+            for n, text in results:
+                out.write(text)
+                rows += n
+                elapsed = time.perf_counter() - start
+                print(f"\r{rows:,} righe, {rows / elapsed:,.0f} righe/s", end='', file=sys.stderr, flush=True)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    print(file=sys.stderr)
+    print(f"{rows:,} righe in {time.perf_counter() - start:.1f} s -> {args.output}")
+
+def run_model_selection(args): #comando select: confronta le configurazioni e stampa la tabella dei risultati
+    with tempfile.TemporaryDirectory(prefix='studyai-') as tmp_dir:
+        source = FileDataSource(args.data, study_system.features + ['study_method'], args.chunk_size) if args.data else None
+        X, y, n_values = study_system.training_codes(args.samples, source, os.path.join(tmp_dir, 'codes.npy'))
+        report = select_model(X, y, n_values, folds=args.folds, n_jobs=args.jobs, latency_budget_ms=args.latency_budget_ms)
+    
+    print(f"{'configurazione':<42} {'accuratezza':>14} {'1 riga ms':>10} {'batch ms':>10} {'KB':>9} {'training s':>11}")
+    for r in report['results']: #* = scelta, p = sul fronte di Pareto, - = non servibile (solo confronto)
+        mark = '*' if r['name'] == report['selected'] else '-' if not r['servable'] else 'p' if r['pareto'] else ' '
+        print(f"{mark} {r['name']:<40} {r['accuracy']:>7.4f} ±{r['accuracy_std']:.3f} {r['single_ms']:>10.3f} "
+              f"{r['batch_ms']:>10.3f} {r['size_bytes'] / 1024:>9.1f} {r['training_s']:>11.3f}")
+    
+    selected = next((r for r in report['results'] if r['name'] == report['selected']), None)
+    if selected is None:
+        print(f"Nessuna configurazione servibile rispetta il budget di {args.latency_budget_ms} ms")
+    else: #il comando per addestrare la foresta scelta
+        options = f"--trees {selected['params']['n_estimators']}"
+        if selected['params'].get('max_depth') is not None:
+            options += f" --max-depth {selected['params']['max_depth']}"
+        print(f"Scelta: {selected['name']} -> python schoolAI.py train {options}")
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+def main(argv=None): #riga di comando: senza argomenti avvia il server di sviluppo
+    parser = argparse.ArgumentParser(description='Sistema AI di raccomandazione metodi di studio')
+    parser.add_argument('--model-dir', help="cartella dell'artefatto del modello")
+    parser.add_argument('--tenant', help='usa il modello di un tenant (scuola o lingua) invece di quello predefinito')
+    commands = parser.add_subparsers(dest='command')
+    
+    commands.add_parser('dev', help='server di sviluppo Flask con debugger (default)')
+    
+    serve_parser = commands.add_parser('serve', help='server di produzione multi-processo')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=8000)
+    serve_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='numero di processi worker')
+    serve_parser.add_argument('--graceful-timeout', type=float, default=30.0, help='secondi concessi ai worker per terminare')
+    serve_parser.add_argument('--access-log', action='store_true', help='registra ogni richiesta su stderr')
+    serve_parser.add_argument('--async', dest='use_async', action='store_true', help='worker asyncio (ASGI) invece dei thread WSGI')
+    serve_parser.add_argument('--concurrency', type=int, default=asgi_app.concurrency, help='valutazioni del modello contemporanee per worker (--async)')
+    serve_parser.add_argument('--request-timeout', type=float, default=asgi_app.timeout, help='secondi massimi per una richiesta (--async)')
+    
+    train_parser = commands.add_parser('train', help="addestra il modello e salva l'artefatto")
+    train_parser.add_argument('--samples', type=int, default=1000, help='numero di esempi di training simulati')
+    train_parser.add_argument('--data', nargs='+', help='file CSV, JSON Lines o Parquet con i dati reali (al posto di quelli simulati)')
+    train_parser.add_argument('--chunk-size', type=int, default=1_000_000, help='righe lette per blocco dai file di dati')
+    train_parser.add_argument('--audit-dir', help='addestra sulle predizioni registrate in questa cartella')
+    train_parser.add_argument('--trees', type=int, default=100, help='numero di alberi della foresta')
+    train_parser.add_argument('--max-depth', type=int, help='profondità massima degli alberi')
+    
+    score_parser = commands.add_parser('score', help='raccomandazioni per tutte le righe di un file CSV o JSON Lines')
+    score_parser.add_argument('input', help='file CSV o JSON Lines con le colonne delle caratteristiche')
+    score_parser.add_argument('output', help='file dei risultati (.csv oppure .jsonl)')
+    score_parser.add_argument('--chunk-size', type=int, default=100_000, help='righe per blocco')
+    score_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='processi che valutano i blocchi')
+    
+    compact_parser = commands.add_parser('compact', help="compatta la foresta dell'artefatto salvato")
+    compact_parser.add_argument('--max-kb', type=float, help='dimensione massima della foresta in memoria (KB)')
+    compact_parser.add_argument('--leaf-dtype', choices=['float16', 'uint8'], default='float16', help='tipo delle probabilità delle foglie')
+    compact_parser.add_argument('--tolerance', type=float, default=0.0, help='differenza massima tra foglie unite in una sola')
+    
+    select_parser = commands.add_parser('select', help='confronta configurazioni del modello con cross-validation')
+    select_parser.add_argument('--samples', type=int, default=10000, help='numero di esempi di training simulati')
+    select_parser.add_argument('--data', nargs='+', help='file CSV, JSON Lines o Parquet con i dati reali')
+    select_parser.add_argument('--chunk-size', type=int, default=1_000_000, help='righe lette per blocco dai file di dati')
+    select_parser.add_argument('--folds', type=int, default=5, help='numero di fold della cross-validation')
+    select_parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='processi per la cross-validation')
+    select_parser.add_argument('--latency-budget-ms', type=float, help='latenza massima per una riga (millisecondi)')
+    select_parser.add_argument('--output', help='salva il report in JSON')
+    
+    args = parser.parse_args(argv)
+    if args.model_dir:
+        study_system.model_dir = args.model_dir
+    if args.tenant:
+        model_registry.root = model_registry.root or os.path.join(study_system.model_dir, 'tenants')
+        study_system.model_dir = model_registry.tenant_dir(args.tenant)
+    
+    if args.command == 'serve':
+        if args.workers > 1 and UPDATE_INTERVAL > 0: #i riscontri arrivano a un solo worker e il master non li vede
+            parser.error('STUDYAI_UPDATE_INTERVAL_S richiede --workers 1')
+        asgi_app.concurrency = args.concurrency
+        asgi_app.timeout = args.request_timeout
+        run_production_server(args.host, args.port, args.workers, args.graceful_timeout, args.access_log,
+                              run_async_worker if args.use_async else run_worker)
+    elif args.command == 'score':
+        run_bulk_scoring(args)
+    elif args.command == 'compact':
+        study_system.compact_model(args.max_kb * 1024 if args.max_kb else None, args.leaf_dtype, args.tolerance)
+        study_system.save_model()
+    elif args.command == 'select':
+        run_model_selection(args)
+    elif args.command == 'train':
+        source = FileDataSource(args.data, study_system.features + ['study_method'], args.chunk_size) if args.data else None
+        if args.audit_dir:
+            source = AuditLog(args.audit_dir).training_source(study_system.features, args.chunk_size)
+        study_system.forest_params = {'n_estimators': args.trees, 'max_depth': args.max_depth}
+        study_system.train_model(args.samples, source=source)
+        study_system.save_model()
+    else:
+        run_dev_server()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schoolAI import StudyRecommendationSystem
+
+
+@pytest.fixture(scope='session')
+def trained_system(): #sistema con una foresta piccola addestrata in memoria, condiviso dai test che non lo modificano
+    system = StudyRecommendationSystem()
+    system.forest_params = {'n_estimators': 20}
+    system.train_model(2000)
+    system.ensure_model()
+    return system
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from schoolAI import COMPACTION_LEVELS, FlatForest, compact_forest
+
+
+@pytest.fixture
+def forest_and_grid(trained_system):
+    state = trained_system.state
+    return FlatForest.from_sklearn(state.model), trained_system.input_grid(state)[0]
+
+
+def test_float16_keeps_every_predicted_class(forest_and_grid):
+    forest, codes = forest_and_grid
+    compacted, report = compact_forest(forest, codes, leaf_dtype='float16')
+    assert report['agreement'] == 1.0
+    assert report['max_abs_drift'] < 1e-3
+    assert report['compacted_bytes'] < report['bytes']
+    assert np.array_equal(np.argmax(compacted.predict_proba(codes), axis=1), np.argmax(forest.predict_proba(codes), axis=1))
+
+
+def test_budget_picks_the_first_level_that_fits(forest_and_grid):
+    forest, codes = forest_and_grid
+    sizes = [forest.compact(dtype, tolerance).nbytes for dtype, tolerance in COMPACTION_LEVELS]
+    budget = sizes[2] #più piccolo di float16 senza tolleranza: servono livelli più aggressivi
+    expected = next(level for level, size in zip(COMPACTION_LEVELS, sizes) if size <= budget)
+    compacted, report = compact_forest(forest, codes, max_bytes=budget)
+    assert (report['leaf_dtype'], report['tolerance']) == expected
+    assert compacted.nbytes <= budget
+    assert report['distinct_trees'] == len(forest.compact(*expected).roots) #nessun albero scartato
+
+
+def test_budget_below_the_last_level_halves_the_trees(forest_and_grid):
+    forest, codes = forest_and_grid
+    dtype, tolerance = COMPACTION_LEVELS[-1]
+    distinct = len(forest.compact(dtype, tolerance).roots)
+    budget = forest.compact(dtype, tolerance, distinct // 2).nbytes
+    compacted, report = compact_forest(forest, codes, max_bytes=budget)
+    assert compacted.nbytes <= budget
+    assert report['distinct_trees'] <= distinct // 2
+    assert (report['leaf_dtype'], report['tolerance']) == (dtype, tolerance)
+
+
+def test_impossible_budget_raises(forest_and_grid):
+    forest, codes = forest_and_grid
+    with pytest.raises(ValueError, match='Impossibile compattare'):
+        compact_forest(forest, codes, max_bytes=1)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+import schoolAI
+from schoolAI import StudyRecommendationSystem
+
+
+@pytest.fixture(scope='module')
+def compacted_system(): #foresta compattata con perdita: le spiegazioni vengono dalla foresta completa
+    system = StudyRecommendationSystem()
+    system.forest_params = {'n_estimators': 20}
+    system.train_model(2000)
+    system.ensure_model()
+    system.compact_model(leaf_dtype='uint8', tolerance=0.2)
+    return system
+
+
+def test_contributions_rebuild_the_served_probabilities(trained_system):
+    state = trained_system.state
+    codes, _ = trained_system.input_grid(state) #stesso ordine delle spiegazioni precalcolate
+    explanations = state.explanations
+    rebuilt = explanations['bias'] + explanations['contributions'].sum(axis=1)
+    assert np.allclose(rebuilt, trained_system.model_predict_proba(codes, state), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('system_fixture', ['trained_system', 'compacted_system'])
+def test_explain_agrees_with_predict(system_fixture, request, monkeypatch):
+    system = request.getfixturevalue(system_fixture)
+    monkeypatch.setattr(schoolAI.model_registry, 'default', system) #le route usano il sistema del registro
+    client = schoolAI.app.test_client()
+    exact = system_fixture == 'trained_system'
+    for key in system.input_grid()[1]:
+        body = dict(zip(system.features, key))
+        predicted = client.post('/predict', json=body).get_json()
+        explained = client.post('/explain', json=body).get_json()
+        assert explained['recommended_method'] == predicted['recommended_method']
+        assert explained['probability'] == pytest.approx(predicted['all_probabilities'][predicted['recommended_method']])
+        assert explained['exact'] is exact
+        if exact:
+            assert explained['bias'] + sum(explained['contributions'].values()) == pytest.approx(explained['probability'])
@@ -0,0 +1,37 @@
+import csv
+import itertools
+
+import numpy as np
+
+from schoolAI import FileDataSource, StudyRecommendationSystem
+
+STYLES = ['a', 'b', 'c', 'd']
+METHODS = {'a': 'uno', 'b': 'due', 'c': 'tre', 'd': 'quattro'} #il metodo dipende solo dallo stile
+
+
+def test_update_replays_the_real_training_data(tmp_path):
+    #dati reali con un vocabolario diverso da quello simulato: il replay deve venire da questi, non dal generatore
+    path = str(tmp_path / 'esiti.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['learning_style', 'subject', 'time_available', 'difficulty', 'study_method'])
+        for _ in range(5):
+            for style, subject, time_available, difficulty in itertools.product(STYLES, 'xyz', 'pq', 'fm'):
+                writer.writerow([style, subject, time_available, difficulty, METHODS[style]])
+
+    system = StudyRecommendationSystem()
+    system.forest_params = {'n_estimators': 20}
+    system.update_trees = 20 #tutti gli alberi vengono sostituiti da quelli addestrati sui riscontri
+    system.train_model(source=FileDataSource([path], system.features + ['study_method'], 1000))
+    system.ensure_model()
+
+    def accuracy():
+        keys = list(itertools.product(STYLES, 'xyz', 'pq', 'fm'))
+        methods = [system.predict(*key)[0] for key in keys]
+        return np.mean([method == METHODS[key[0]] for method, key in zip(methods, keys)])
+
+    assert accuracy() == 1.0
+    for _ in range(50):
+        system.record_feedback('a', 'x', 'p', 'f', 'uno')
+    assert system.update_model(force=True)
+    assert accuracy() == 1.0
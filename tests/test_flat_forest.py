@@ -0,0 +1,13 @@
+import numpy as np
+
+from schoolAI import FlatForest
+
+
+def test_flat_forest_matches_sklearn_on_every_input(trained_system):
+    state = trained_system.state
+    codes, _ = trained_system.input_grid(state)
+    expected = state.model.predict_proba(codes)
+    assert np.array_equal(FlatForest.from_sklearn(state.model).predict_proba(codes), expected)
+    assert np.array_equal(state.flat_forest.predict_proba(codes), expected) #la foresta servita dal backend 'flat'
+    for row in codes[:5]: #riga singola, come nelle richieste
+        assert np.array_equal(state.flat_forest.predict_proba(row), state.model.predict_proba(row[None, :]))
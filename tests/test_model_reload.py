@@ -0,0 +1,30 @@
+from schoolAI import StudyRecommendationSystem
+
+
+def publish(model_dir, trees): #addestra una foresta piccola e la salva nella cartella, come il comando train
+    trainer = StudyRecommendationSystem()
+    trainer.forest_params = {'n_estimators': trees}
+    trainer.train_model(2000)
+    trainer.save_model(model_dir)
+
+
+def test_update_after_rollback_uses_the_rolled_back_model(tmp_path):
+    model_dir = str(tmp_path)
+    publish(model_dir, trees=20)
+    system = StudyRecommendationSystem()
+    system.model_dir = model_dir
+    system.update_trees = 4
+    system.ensure_model()
+    first_version = system.model_version
+
+    publish(model_dir, trees=5) #nuovo artefatto nella stessa cartella: sostituisce model.joblib
+    system.reload_model()
+    system.rollback_model()
+    assert system.model_version == first_version
+
+    #il modello sklearn viene caricato solo ora: deve essere quello del primo artefatto, non quello annullato
+    state = system.state
+    system.record_feedback(*(str(state.encoders[feature].classes_[0]) for feature in state.features), state.class_names[0])
+    assert system.update_model(force=True)
+    assert len(system.state.model.estimators_) == 20
+    assert len(system.state.flat_forest.roots) == 20